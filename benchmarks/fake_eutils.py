@@ -0,0 +1,121 @@
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from socketserver import ThreadingMixIn
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class FakeEutilsHandler(BaseHTTPRequestHandler):
+    '''Serves taxonomy esearch and esummary JSON in the shape NCBI returns it'''
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+        self.server.count(endpoint)
+        time.sleep(self.server.latency)
+        if self.server.rate_limit_rate and self.server.random.random() < self.server.rate_limit_rate:
+            self.server.count('429')
+            self.send_json(429, {'error': 'API rate limit exceeded'})
+        elif endpoint == 'esearch.fcgi':
+            self.send_json(200, self.server.esearch(query.get('term', [''])[0], int(query.get('retmax', ['20'])[0])))
+        elif endpoint == 'esummary.fcgi':
+            self.send_json(200, self.server.esummary(query.get('id', [''])[0].split(',')))
+        else:
+            self.send_json(404, {'error': f'Unknown endpoint {endpoint}'})
+
+    def send_json(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeEutilsServer(ThreadingMixIn, HTTPServer):
+    '''
+    A local stand-in for the NCBI E-utilities answering from a given taxonomy, with configurable latency and a share
+    of requests answered with HTTP 429, which counts the requests made to each endpoint
+    '''
+    daemon_threads = True
+
+    def __init__(self, taxa, latency=0.0, rate_limit_rate=0.0, address=('127.0.0.1', 0), seed=0):
+        super().__init__(address, FakeEutilsHandler)
+        self.taxa = taxa
+        self.names = {}
+        for taxon_id, (name, rank) in taxa.items():
+            self.names.setdefault(name.lower(), []).append(taxon_id)
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d/entrez/eutils/' % self.server_address[:2]
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def esearch(self, term, retmax=20):
+        '''Answers a single name, or quoted names OR-ed together with a translation stack counting each one's matches'''
+        phrases = re.findall(r'"([^"]*)"\[All Names\]', term)
+        if not phrases:
+            taxon_ids = self.names.get(term.strip().lower(), [])
+            return {'esearchresult': {'count': str(len(taxon_ids)), 'idlist': taxon_ids[:retmax]}}
+        taxon_ids = []
+        translation_stack = []
+        not_found = []
+        for phrase in phrases:
+            phrase_ids = self.names.get(phrase.lower(), [])
+            if not phrase_ids:
+                not_found.append(phrase)
+                continue
+            taxon_ids.extend(taxon_id for taxon_id in phrase_ids if taxon_id not in taxon_ids)
+            translation_stack.append({'term': f'"{phrase}"[All Names]', 'field': 'All Names',
+                                      'count': str(len(phrase_ids)), 'explode': 'N'})
+            if len(translation_stack) > 1:
+                # the stack is in postfix order, so each phrase after the first is followed by its OR
+                translation_stack.append('OR')
+        result = {'count': str(len(taxon_ids)), 'idlist': taxon_ids[:retmax],
+                  'translationstack': translation_stack + ['GROUP']}
+        if not_found:
+            result['errorlist'] = {'phrasesnotfound': not_found}
+        return {'esearchresult': result}
+
+    def esummary(self, taxon_ids):
+        result = {'uids': []}
+        for taxon_id in taxon_ids:
+            if taxon_id in self.taxa:
+                name, rank = self.taxa[taxon_id]
+                result['uids'].append(taxon_id)
+                result[taxon_id] = {'uid': taxon_id, 'taxid': int(taxon_id), 'scientificname': name, 'rank': rank}
+            else:
+                result[taxon_id] = {'uid': taxon_id, 'error': 'cannot get document summary'}
+        return {'result': result}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+'''
+Benchmarks manifest loading, entry verification and whole validations on synthetic manifests against a local fake
+NCBI, reporting throughput, peak memory and the requests each stage made, so regressions show up without any traffic
+to the real NCBI
+'''
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_manifests import generate_manifest
+from benchmarks.fake_eutils import FakeEutilsServer
+
+
+def peak_rss_mb():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def bench_load(manifest, eutils_url, requests_per_second):
+    from validation_components.manifest_querying import SpreadsheetLoader
+    start = time.perf_counter()
+    rows = sum(1 for manifest_entry in SpreadsheetLoader(manifest).load())
+    return {'rows': rows, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}
+
+
+def bench_verify(manifest, eutils_url, requests_per_second):
+    from validation_components.manifest_querying import SpreadsheetLoader, NcbiQuery
+    from validation_components.validation import verify_entries
+    all_entries = list(SpreadsheetLoader(manifest).load())
+    start = time.perf_counter()
+    with NcbiQuery(base_url=eutils_url, requests_per_second=requests_per_second) as connecter:
+        errors = verify_entries(all_entries, connecter)
+    return {'rows': len(all_entries), 'errors': len(errors), 'seconds': time.perf_counter() - start,
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def bench_end_to_end(manifest, eutils_url, requests_per_second):
+    from validation_components.validation import validation_runner
+    arguments = argparse.Namespace(spreadsheet=[manifest], no_cache=True, eutils_url=eutils_url)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        validation_runner(arguments)
+    return {'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}
+
+
+STAGES = {
+    'load': bench_load,
+    'verify': bench_verify,
+    'end-to-end': bench_end_to_end,
+}
+
+
+def run_stage(stage, manifest, server, requests_per_second):
+    '''Runs a stage in a fresh process so its peak memory is its own, counting the fake NCBI requests it made'''
+    requests_before = Counter(server.requests)
+    with ProcessPoolExecutor(1) as pool:
+        result = pool.submit(STAGES[stage], manifest, server.url, requests_per_second).result()
+    result['requests'] = dict(Counter(server.requests) - requests_before)
+    return result
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help='Manifest sizes to benchmark')
+    parser.add_argument('--format', type=str, nargs='+', default=['xlsx'], choices=['xlsx', 'xls', 'csv', 'tsv'],
+                        help='Manifest formats to benchmark')
+    parser.add_argument('--distinct-ratio', type=float, default=0.1, help='Distinct taxa per row (default: 0.1)')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Share of rows with errors (default: 0.05)')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fake NCBI takes to answer')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='Share of requests the fake NCBI answers with HTTP 429')
+    parser.add_argument('--requests-per-second', type=float, default=3,
+                        help='Request rate the verify stage is limited to (default: 3, as for NCBI)')
+    parser.add_argument('--stages', type=str, nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--json', type=str, default=None, help='Also write the results to this JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for manifest_format in arguments.format:
+            for rows in arguments.rows:
+                manifest = os.path.join(directory, f'manifest_{rows}.{manifest_format}')
+                taxa = generate_manifest(manifest, rows, arguments.distinct_ratio, arguments.error_rate)
+                with FakeEutilsServer(taxa, arguments.latency, arguments.rate_limit_rate) as server:
+                    for stage in arguments.stages:
+                        result = run_stage(stage, manifest, server, arguments.requests_per_second)
+                        result.update({'stage': stage, 'format': manifest_format, 'manifest_rows': rows,
+                                       'distinct_taxa': len(taxa)})
+                        results.append(result)
+                        print(f"{stage:>10} {manifest_format:>4} {rows:>8} rows {len(taxa):>6} taxa: "
+                              f"{result['seconds']:8.2f}s {rows / result['seconds']:10.0f} rows/s "
+                              f"{result['peak_rss_mb']:8.1f} MB peak  requests {result['requests']}", flush=True)
+    if arguments.json:
+        with open(arguments.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
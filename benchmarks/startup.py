@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+'''
+Times cold starts of the manifest-validator script, as seen by a portal validating small manifests one process at a
+time, and lists which heavy dependencies each kind of run imports
+'''
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_manifests import generate_manifest
+from benchmarks.fake_eutils import FakeEutilsServer
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPOSITORY, 'scripts', 'manifest-validator')
+HEAVY_MODULES = ['xlrd', 'openpyxl', 'requests', 'asyncio', 'multiprocessing']
+
+
+# runs the script, then lists the modules it imported on the last line of stderr, as -X importtime needs Python 3.7
+LIST_IMPORTS = ('import sys, runpy\n'
+                'sys.argv = sys.argv[1:]\n'
+                'try:\n'
+                '    runpy.run_path(sys.argv[0], run_name="__main__")\n'
+                'finally:\n'
+                '    print(" ".join(sorted(sys.modules)), file=sys.stderr)')
+
+
+def run_validator(arguments, list_imports=False):
+    command = [sys.executable] + (['-c', LIST_IMPORTS] if list_imports else []) + [SCRIPT] + arguments
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY)
+    return subprocess.run(command, env=environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def imported_heavy_modules(arguments):
+    stderr = run_validator(arguments, list_imports=True).stderr
+    imported = set(stderr.strip().splitlines()[-1].split()) if stderr.strip() else set()
+    return [module for module in HEAVY_MODULES if module in imported]
+
+
+def time_startup(arguments, runs):
+    timings = []
+    for run in range(runs):
+        started = time.perf_counter()
+        run_validator(arguments)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10, help='Cold starts timed per scenario (default: 10)')
+    parser.add_argument('--rows', type=int, default=20, help='Rows in the small manifests (default: 20)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = os.path.join(directory, 'taxonomy.sqlite')
+        manifests = {}
+        for extension in ['csv', 'xlsx']:
+            manifests[extension] = os.path.join(directory, f'manifest.{extension}')
+            taxa = generate_manifest(manifests[extension], arguments.rows, error_rate=0)
+        with FakeEutilsServer(taxa) as server:
+            resolver = ['--cache-path', cache, '--eutils-url', server.url]
+            # fill the cache so the scenarios below are fully cached runs that never need the network
+            run_validator([manifests['csv']] + resolver)
+            scenarios = [('--help', ['--help']),
+                         ('cached csv', [manifests['csv']] + resolver),
+                         ('cached xlsx', [manifests['xlsx']] + resolver),
+                         ('uncached csv', [manifests['csv'], '--no-cache', '--eutils-url', server.url])]
+            for name, scenario in scenarios:
+                timings = time_startup(scenario, arguments.runs)
+                print(f'{name:>14}: median {statistics.median(timings) * 1000:7.1f} ms, '
+                      f'min {min(timings) * 1000:7.1f} ms  imports {", ".join(imported_heavy_modules(scenario))}',
+                      flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+import csv
+import random
+import openpyxl
+
+HEADER = ['SANGER PLATE ID', 'WELL', 'SUPPLIER SAMPLE NAME', 'TAXON ID', 'COMMON NAME']
+
+
+def synthetic_taxa(distinct_taxa, first_taxon_id=100000):
+    '''Returns {taxon ID: (scientific name, rank)} for a made-up taxonomy of distinct_taxa species'''
+    return {str(first_taxon_id + number): (f'Genus{number} species{number}', 'species')
+            for number in range(distinct_taxa)}
+
+
+def synthetic_rows(rows, taxa, error_rate, seed):
+    '''
+    Yields manifest rows drawn from taxa, with roughly error_rate of them carrying a misspelled name or an unknown ID
+    '''
+    generator = random.Random(seed)
+    taxon_ids = sorted(taxa)
+    for row in range(rows):
+        taxon_id = generator.choice(taxon_ids)
+        common_name = taxa[taxon_id][0]
+        if generator.random() < error_rate:
+            if generator.random() < 0.5:
+                common_name = common_name[:-1]
+            else:
+                taxon_id = str(int(taxon_id) + 10000000)
+        yield [f'PLATE{row // 96}', f'A{row % 96 + 1}', f'sample{row}', int(taxon_id), common_name]
+
+
+def generate_manifest(path, rows=1000, distinct_ratio=0.1, error_rate=0.05, seed=0):
+    '''
+    Writes a synthetic manifest to path as .xlsx, .xls (needs xlwt) or .csv/.tsv, returning the taxa it was drawn from
+    so a fake NCBI can be seeded with them
+    '''
+    taxa = synthetic_taxa(max(1, int(rows * distinct_ratio)))
+    preamble = [['Synthetic manifest for benchmarking'], []]
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xlsx':
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in preamble + [HEADER]:
+            sheet.append(row)
+        for row in synthetic_rows(rows, taxa, error_rate, seed):
+            sheet.append(row)
+        workbook.save(path)
+    elif extension == '.xls':
+        try:
+            import xlwt
+        except ImportError:
+            raise SystemExit('Writing .xls manifests needs xlwt - pip install xlwt')
+        workbook = xlwt.Workbook()
+        sheet = workbook.add_sheet('Sheet1')
+        all_rows = preamble + [HEADER] + list(synthetic_rows(rows, taxa, error_rate, seed))
+        for row_number, row in enumerate(all_rows):
+            for column, value in enumerate(row):
+                sheet.write(row_number, column, value)
+        workbook.save(path)
+    elif extension in ['.csv', '.tsv']:
+        with open(path, 'w', newline='') as manifest:
+            writer = csv.writer(manifest, delimiter='\t' if extension == '.tsv' else ',')
+            writer.writerows(preamble + [HEADER])
+            writer.writerows(synthetic_rows(rows, taxa, error_rate, seed))
+    else:
+        raise ValueError(f'Cannot write synthetic manifests as {extension}')
+    return taxa
@@ -0,0 +1,178 @@
+import sys
+import argparse
+
+
+def positive_int(value):
+    '''Parses a command line value as a whole number of at least one'''
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive whole number')
+    return number
+
+
+def non_negative_int(value):
+    '''Parses a command line value as a whole number of at least zero'''
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'{value} is not zero or a positive whole number')
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='manifest-validator',
+        epilog='Run "manifest-validator build-taxdump --help" for compiling an offline taxdump index, '
+               '"manifest-validator serve --help" for running a validation daemon, or '
+               '"manifest-validator warm-cache --help" for filling the taxonomy cache ahead of validations.')
+    parser.add_argument('spreadsheet', type=str, nargs='+',
+                        help='Manifest spreadsheet to be checked for matching taxon and common name. Several '
+                             'manifests, directories of manifests or glob patterns can be given to validate them '
+                             'together')
+    parser.add_argument('--workers', type=positive_int, default=None,
+                        help='Processes used to read several manifests in parallel (default: one per CPU)')
+    parser.add_argument('--all-sheets', action='store_true',
+                        help="Validate every worksheet of a workbook with a 'SANGER PLATE ID' header row, reporting on "
+                             "each sheet, instead of only the first worksheet")
+    parser.add_argument('--output-format', type=str, default='text', choices=['text', 'ndjson'],
+                        help='Report errors as text, or as one JSON record per line written as each error is found, '
+                             'followed by a summary record per manifest (default: text)')
+    error_budget = parser.add_mutually_exclusive_group()
+    error_budget.add_argument('--max-errors', type=positive_int, default=None,
+                              help='Stop checking a manifest once this many errors were found, without looking up the '
+                                   'rest of its taxa')
+    error_budget.add_argument('--fail-fast', action='store_true',
+                              help='Stop checking a manifest at its first error, as with --max-errors 1')
+    parser.add_argument('--sample', type=positive_int, default=None,
+                        help='Check this many of the distinct taxa of a manifest, picked at random, before the rest, '
+                             'and reject the manifest on the errors of the sample alone if it has any')
+    parser.add_argument('--results-file', type=str, default=None,
+                        help='Reuse the verdicts saved in this file by an earlier run for rows whose sample name, '
+                             'taxon ID and common name are unchanged, and save the verdicts of this run to it')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print time spent per stage, NCBI request counts and latencies, rate limit waits and '
+                             'cache hit ratios once validation finishes')
+    parser.add_argument('--stats-file', type=str, default=None, help='Write the run statistics to this file')
+    parser.add_argument('--stats-format', type=str, default='json', choices=['json', 'prometheus'],
+                        help='Format of --stats-file: JSON or Prometheus text exposition (default: json)')
+    add_resolver_arguments(parser)
+    return parser
+
+
+def add_resolver_arguments(parser):
+    parser.add_argument('--taxdump', type=str, default=None,
+                        help='Resolve taxonomy offline from a taxdump index built with "manifest-validator '
+                             'build-taxdump" instead of querying NCBI')
+    parser.add_argument('--suggestions', type=non_negative_int, default=3,
+                        help='Names suggested for each common name that does not exist, from the taxdump index or '
+                             'the names in the taxonomy cache, or 0 for none (default: 3)')
+    add_cache_arguments(parser)
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument('--no-cache', action='store_true',
+                            help='Query NCBI for everything without reading or writing the taxonomy cache')
+    cache_mode.add_argument('--refresh-cache', action='store_true',
+                            help='Ignore cached results but store fresh NCBI results in the cache')
+    add_ncbi_arguments(parser)
+
+
+def add_cache_arguments(parser):
+    parser.add_argument('--cache-path', type=str, default=None,
+                        help='Location of the persistent taxonomy cache (default: $MANIFEST_VALIDATOR_CACHE or '
+                             '~/.cache/manifest-validator/taxonomy.sqlite)')
+    parser.add_argument('--cache-ttl', type=float, default=30,
+                        help='Days before a cached NCBI result expires (default: 30)')
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='Maximum number of taxon IDs and of names kept in the cache (default: 100000)')
+
+
+def add_ncbi_arguments(parser):
+    parser.add_argument('--eutils-url', type=str, default=None,
+                        help='Base URL of the NCBI E-utilities to query, such as a local mirror '
+                             '(default: https://eutils.ncbi.nlm.nih.gov/entrez/eutils/)')
+    parser.add_argument('--api-key', type=str, default=None,
+                        help='NCBI API key, raising the request rate from 3 to 10 per second (default: $NCBI_API_KEY)')
+    parser.add_argument('--tool', type=str, default=None,
+                        help='Tool name reported to NCBI with each request (default: $NCBI_TOOL or manifest-validator)')
+    parser.add_argument('--email', type=str, default=None,
+                        help='Contact address reported to NCBI with each request (default: $NCBI_EMAIL)')
+    parser.add_argument('--max-attempts', type=positive_int, default=5,
+                        help='Attempts made at each NCBI request that is rate limited or fails (default: 5)')
+    parser.add_argument('--retry-budget', type=int, default=100,
+                        help='Retries allowed across the whole run before failing lookups are reported as '
+                             'unresolved (default: 100)')
+
+
+def build_serve_parser():
+    parser = argparse.ArgumentParser(
+        prog='manifest-validator serve',
+        description='Run a validation daemon that keeps its taxonomy cache and NCBI connections warm between uploads. '
+                    'POST a manifest to /validate?filename=NAME to get its results as JSON')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    add_resolver_arguments(parser)
+    return parser
+
+
+def build_taxdump_parser():
+    parser = argparse.ArgumentParser(
+        prog='manifest-validator build-taxdump',
+        description='Compile names.dmp and nodes.dmp from an NCBI taxdump (ftp.ncbi.nih.gov/pub/taxonomy/taxdump.tar.gz)'
+                    ' into an index for offline validation with --taxdump')
+    parser.add_argument('dump_directory', type=str, help='Directory holding the extracted names.dmp and nodes.dmp')
+    parser.add_argument('index_directory', type=str, help='Directory to write the compiled index to')
+    return parser
+
+
+def build_warm_cache_parser():
+    parser = argparse.ArgumentParser(
+        prog='manifest-validator warm-cache',
+        description='Resolve taxon IDs and names through NCBI ahead of time into the persistent taxonomy cache, so '
+                    'that later validations need no network access. An interrupted warm-up carries on where it '
+                    'stopped when run again')
+    parser.add_argument('manifests', type=str, nargs='*',
+                        help='Manifests, directories of manifests or glob patterns whose organisms should be cached')
+    parser.add_argument('--taxon-ids', type=str, action='append', default=[],
+                        help='File listing taxon IDs to cache, one per line. Can be given several times')
+    parser.add_argument('--names', type=str, action='append', default=[],
+                        help='File listing organism names to cache, one per line. Can be given several times')
+    add_cache_arguments(parser)
+    add_ncbi_arguments(parser)
+    return parser
+
+
+def run_validation(arguments: argparse.Namespace):
+    from validation_components.validation import validation_runner
+    validation_runner(arguments)
+
+
+def run_serve(arguments: argparse.Namespace):
+    from validation_components.server import serve
+    serve(arguments)
+
+
+def run_build_taxdump(arguments: argparse.Namespace):
+    from validation_components.taxdump import compile_taxdump
+    compile_taxdump(arguments.dump_directory, arguments.index_directory)
+    print(f'Taxdump index written to {arguments.index_directory}')
+
+
+def run_warm_cache(arguments: argparse.Namespace):
+    if not (arguments.manifests or arguments.taxon_ids or arguments.names):
+        raise SystemExit('manifest-validator warm-cache: give manifests, --taxon-ids or --names to cache')
+    from validation_components.warm_cache import warm_cache
+    warm_cache(arguments)
+
+
+COMMANDS = {
+    'serve': (build_serve_parser, run_serve),
+    'build-taxdump': (build_taxdump_parser, run_build_taxdump),
+    'warm-cache': (build_warm_cache_parser, run_warm_cache),
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        build_command_parser, run_command = COMMANDS[argv[0]]
+        run_command(build_command_parser().parse_args(argv[1:]))
+    else:
+        run_validation(build_parser().parse_args(argv))
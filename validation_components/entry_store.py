@@ -0,0 +1,54 @@
+from array import array
+from validation_components.manifest_querying import ManifestEntry
+
+
+class EntryStore:
+    '''The entries of a manifest held column by column, keeping each distinct common name and taxon ID pair once'''
+    def __init__(self, entries=()):
+        self.sample_ids = []
+        self.rows = array('q')
+        self.pair_positions = array('q')
+        self.pairs = []
+        self.first_rows = array('q')
+        self._pair_index = {}
+        self.extend(entries)
+
+    def extend(self, entries):
+        for manifest_entry in entries:
+            pair = (manifest_entry.common_name, manifest_entry.taxon_id)
+            position = self._pair_index.get(pair)
+            if position is None:
+                position = self._pair_index[pair] = len(self.pairs)
+                self.pairs.append(pair)
+                self.first_rows.append(len(self.sample_ids))
+            self.pair_positions.append(position)
+            self.sample_ids.append(manifest_entry.sample_id)
+            self.rows.append(-1 if manifest_entry.row is None else manifest_entry.row)
+
+    def __len__(self):
+        return len(self.sample_ids)
+
+    def __getitem__(self, index):
+        common_name, taxon_id = self.pairs[self.pair_positions[index]]
+        row = self.rows[index]
+        return ManifestEntry(self.sample_ids[index], common_name, taxon_id, None if row < 0 else row)
+
+    def __iter__(self):
+        pairs = self.pairs
+        for sample_id, row, position in zip(self.sample_ids, self.rows, self.pair_positions):
+            common_name, taxon_id = pairs[position]
+            yield ManifestEntry(sample_id, common_name, taxon_id, None if row < 0 else row)
+
+    def distinct_entries(self):
+        '''Returns the first entry of each distinct pair of common name and taxon ID, in the order they appear'''
+        return [self[index] for index in self.first_rows]
+
+    def __getstate__(self):
+        # the index of pairs is rebuilt rather than sent along when a store is passed between processes
+        state = dict(self.__dict__)
+        del state['_pair_index']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pair_index = {pair: position for position, pair in enumerate(self.pairs)}
@@ -1,19 +1,29 @@
-import xlrd
-import openpyxl
-import requests
-from datetime import datetime
+import os
+import csv
+import threading
+from urllib.parse import urlencode, quote
 import time
+from validation_components.rate_limiting import TokenBucket, RetryPolicy
+from validation_components.metrics import Metrics
+from validation_components.name_suggestions import NameSuggester
 
 
 class ManifestEntry:
     '''
-    A class construct for a single entry from the manifest submitted and query the entries when necessary
+    A class construct for a single entry from the manifest submitted and query the entries when necessary. Entries have
+    no per-instance __dict__, as a manifest can hold hundreds of thousands of them
     '''
-    def __init__(self, sample_id: str, common_name, taxon_id):
+    __slots__ = ['sample_id', 'common_name', 'taxon_id', 'row']
+
+    def __init__(self, sample_id: str, common_name, taxon_id, row=None):
         self.sample_id = sample_id
         self.common_name = common_name
         self.taxon_id = taxon_id
-        self.query_id = common_name + str(taxon_id)
+        self.row = row
+
+    @property
+    def query_id(self):
+        return self.common_name + str(self.taxon_id)
 
     @staticmethod
     def report_error(error_code, common_name_statement, taxon_id_statement):
@@ -44,30 +54,242 @@ class ManifestEntry:
             statement = f"The official name for the given taxon ID {self.taxon_id} is '{ncbi_result}'."
         return statement
 
-class NcbiQuery:
+    @staticmethod
+    def suggestion_definition(suggestions):
+        names = ' or '.join(f"'{name}' (taxon ID {taxon_id})" for name, taxon_id in suggestions)
+        return f' Did you mean {names}?' if names else ''
 
-    def __init__(self):
-        self.timestamp = None
 
-    @staticmethod
-    def get_now():
-        return datetime.now()
+class EntryError(str):
+    '''
+    An error found in a manifest entry, which reads as the message reported to users and carries the details behind it
+    as a record for machine-readable output
+    '''
+    fields = ['sample_id', 'row', 'error', 'error_code', 'given_name', 'given_taxon_id', 'expected_name',
+              'expected_taxon_id', 'rank', 'suggestions']
+
+    def __new__(cls, message, record=None):
+        entry_error = super().__new__(cls, message)
+        entry_error.record = {field: None for field in EntryError.fields}
+        entry_error.record.update(record or {})
+        entry_error.record['message'] = message
+        return entry_error
+
 
-    def generate_new_timestamp(self):
-        if self.timestamp != None:
-            time_since_last_query = NcbiQuery.get_now() - self.timestamp
+class NcbiUnavailableError(ConnectionError):
+    '''Raised when NCBI still has not answered a query after every retry allowed'''
 
-            required_microsecond_delay = 335000
-            if time_since_last_query.days == 0 and time_since_last_query.seconds == 0 and time_since_last_query.microseconds < required_microsecond_delay:
-                time.sleep((required_microsecond_delay - time_since_last_query.microseconds) / 1000000)
 
-        self.timestamp = NcbiQuery.get_now()
+class UnreadableManifestError(ValueError):
+    '''Raised when a manifest cannot be parsed, such as a corrupt workbook or one that is not a workbook at all'''
 
 
+class NcbiQuery:
+    base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+    # NCBI advise keeping esummary GET requests to a couple of hundred IDs
+    esummary_batch_size = 200
+    # names OR-ed together in each batched esearch request, keeping its URL well within NCBI's length limit
+    esearch_batch_size = 50
+    # requests per second NCBI permit without and with an API key
+    anonymous_rate = 3
+    api_key_rate = 10
+    credentials = ''
+    suggestion_limit = 3
+    cache = None
+    metrics = Metrics(enabled=False)
+    _session = None
+    _session_lock = threading.Lock()
+    _suggester = None
+    _suggester_version = None
+    _suggester_lock = threading.Lock()
+
+    def __init__(self, cache=None, requests_per_second=None, max_in_flight=5, pool_size=10, timeout=(10, 60),
+                 compress=True, retry_policy=None, base_url=None, metrics=None, api_key=None, tool=None, email=None,
+                 suggestion_limit=3):
+        self.cache = cache
+        self.suggestion_limit = suggestion_limit
+        if metrics is not None:
+            self.metrics = metrics
+        if base_url is not None:
+            self.base_url = base_url.rstrip('/') + '/'
+        credentials = {name: value for name, value in [('api_key', api_key), ('tool', tool), ('email', email)] if value}
+        if credentials:
+            self.credentials = '&' + urlencode(credentials)
+        if requests_per_second is None:
+            requests_per_second = NcbiQuery.api_key_rate if api_key else NcbiQuery.anonymous_rate
+        self.limiter = TokenBucket(requests_per_second)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_in_flight = max_in_flight
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.compress = compress
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self):
+        '''
+        One keep-alive session reused by every query, so a run opens a handful of pooled connections to NCBI
+        instead of paying a fresh TCP and TLS handshake per lookup
+        '''
+        import requests
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate' if self.compress else 'identity'})
+                self._session = session
+        return self._session
+
+    def throttle(self):
+        self.metrics.add_time('rate_limit_wait_seconds', self.limiter.acquire())
+
+    def count_cache_results(self, kind, hits, misses):
+        if self.cache is not None:
+            self.metrics.count('cache_hits', hits, kind=kind)
+            self.metrics.count('cache_misses', misses, kind=kind)
+
     def query_ncbi_for_taxon_id(self, manifest_entry: ManifestEntry):
-        self.generate_new_timestamp()
+        if self.cache is not None:
+            cached_taxon_id = self.cache.get_taxon_id(manifest_entry.common_name)
+            self.count_cache_results('name', cached_taxon_id is not None, cached_taxon_id is None)
+            if cached_taxon_id is not None:
+                return cached_taxon_id
+        self.throttle()
         url = self.build_url(manifest_entry, esearch=True)
-        tax_id_json = self.ncbi_search(url)
+        ncbi_taxon_id = NcbiQuery.extract_taxon_id(self.ncbi_search(url))
+        if self.cache is not None:
+            self.cache.put_taxon_id(manifest_entry.common_name, ncbi_taxon_id)
+        return ncbi_taxon_id
+
+    def query_ncbi_for_taxon_ids(self, names):
+        '''
+        Resolves many names with batched esearch requests kept in flight together, returning a lookup table of name ->
+        taxon ID in which names NCBI never answered for are '__unresolved__'
+        '''
+        lookup = {}
+        if self.cache is not None:
+            lookup.update(self.cache.get_taxon_ids(names))
+        uncached_names = sorted(set(names) - set(lookup))
+        self.count_cache_results('name', len(lookup), len(uncached_names))
+        name_lookup = {}
+        for name, ncbi_taxon_id in self.search_names(uncached_names).items():
+            if ncbi_taxon_id is None:
+                lookup[name] = '__unresolved__'
+            else:
+                name_lookup[name] = ncbi_taxon_id
+        if self.cache is not None and name_lookup:
+            self.cache.put_taxon_ids(name_lookup)
+        lookup.update(name_lookup)
+        return lookup
+
+    def search_names(self, names):
+        '''Resolves names to taxon IDs in batched esearch requests, with None for names NCBI never answered for'''
+        lookup = {}
+        single_names = [name for name in names if not NcbiQuery.batchable(name)]
+        batches = self.name_batches([name for name in names if NcbiQuery.batchable(name)])
+        # an OR-ed esearch counts the taxa each name matches, a second fetches the IDs of names matching one taxon and
+        # an esummary maps them back; names a batch cannot map back, such as synonyms, are searched for alone
+        unique_names = []
+        count_results = self.ncbi_search_all([self.build_names_search_url(batch, retmax=0) for batch in batches])
+        for batch, count_json in zip(batches, count_results):
+            if count_json is None:
+                lookup.update({name: None for name in batch})
+                continue
+            counts = NcbiQuery.extract_term_counts(count_json)
+            for name in batch:
+                count = counts.get(name.lower())
+                if count is None:
+                    single_names.append(name)
+                elif count == 1:
+                    unique_names.append(name)
+                else:
+                    lookup[name] = '__null__'
+
+        batches = self.name_batches(unique_names)
+        search_results = self.ncbi_search_all([self.build_names_search_url(batch, retmax=len(batch))
+                                               for batch in batches])
+        mapped_batches = []
+        for batch, search_json in zip(batches, search_results):
+            taxon_ids = search_json.get('esearchresult', {}).get('idlist', []) if search_json is not None else None
+            if taxon_ids is None:
+                lookup.update({name: None for name in batch})
+            elif len(batch) == 1 and len(taxon_ids) == 1:
+                lookup[batch[0]] = str(taxon_ids[0])
+            else:
+                mapped_batches.append((batch, [str(taxon_id) for taxon_id in taxon_ids]))
+        summary_results = self.ncbi_search_all([self.build_batch_url(taxon_ids) for batch, taxon_ids in mapped_batches])
+        for (batch, taxon_ids), summary_json in zip(mapped_batches, summary_results):
+            if summary_json is None:
+                lookup.update({name: None for name in batch})
+                continue
+            batch_lookup = NcbiQuery.match_names(batch, taxon_ids, summary_json)
+            lookup.update(batch_lookup)
+            single_names.extend(name for name in batch if name not in batch_lookup)
+
+        search_results = self.ncbi_search_all([self.build_search_url(name) for name in single_names])
+        for name, tax_id_json in zip(single_names, search_results):
+            lookup[name] = None if tax_id_json is None else NcbiQuery.extract_taxon_id(tax_id_json)
+        return lookup
+
+    def name_batches(self, names):
+        return [names[start:start + self.esearch_batch_size] for start in range(0, len(names), self.esearch_batch_size)]
+
+    @staticmethod
+    def batchable(name):
+        '''Whether a name can be quoted as a phrase in an OR-ed search without changing its meaning'''
+        return not any(character in name for character in '"[]()*')
+
+    @staticmethod
+    def extract_term_counts(search_json):
+        '''Returns how many taxa each lowercased phrase of an OR-ed esearch matched'''
+        result = search_json.get('esearchresult', {})
+        counts = {}
+        for term in result.get('translationstack', []):
+            if isinstance(term, dict) and term.get('term', '').endswith('[All Names]'):
+                phrase = term['term'][:-len('[All Names]')].strip().strip('"').lower()
+                counts[phrase] = int(term.get('count', 0))
+        for phrase in result.get('errorlist', {}).get('phrasesnotfound', []):
+            counts.setdefault(phrase.strip().strip('"').lower(), 0)
+        return counts
+
+    @staticmethod
+    def match_names(names, taxon_ids, summary_json):
+        '''Maps names back to the taxon IDs whose esummary names match them'''
+        result = summary_json.get('result', {})
+        known_names = {}
+        for taxon_id in taxon_ids:
+            summary = result.get(taxon_id, {})
+            for field in ['scientificname', 'commonname', 'genbankcommonname']:
+                if summary.get(field):
+                    known_names.setdefault(summary[field].lower(), set()).add(taxon_id)
+        lookup = {name: next(iter(known_names[name.lower()])) for name in names
+                  if len(known_names.get(name.lower(), ())) == 1}
+        unmatched_names = [name for name in names if name not in lookup]
+        unmatched_ids = set(taxon_ids) - set(lookup.values())
+        # a single name and a single taxon ID left over belong together
+        if len(unmatched_names) == 1 and len(unmatched_ids) == 1:
+            lookup[unmatched_names[0]] = unmatched_ids.pop()
+        return lookup
+
+    @staticmethod
+    def answered(search_json):
+        '''Whether a reply holds esummary results or an esearch ID list rather than an error'''
+        if not isinstance(search_json, dict) or 'error' in search_json:
+            return False
+        if isinstance(search_json.get('result'), dict):
+            return True
+        search_result = search_json.get('esearchresult')
+        return isinstance(search_result, dict) and 'ERROR' not in search_result and 'idlist' in search_result
+
+    @staticmethod
+    def extract_taxon_id(tax_id_json):
         if 'esearchresult' in tax_id_json and 'idlist' in tax_id_json['esearchresult'] and len(
                 tax_id_json['esearchresult']['idlist']) == 1:
             return str(tax_id_json['esearchresult']['idlist'][0])
@@ -75,121 +297,395 @@ class NcbiQuery:
             return '__null__'
 
     def query_ncbi_for_common_name(self, manifest_entry: ManifestEntry):
-        self.generate_new_timestamp()
+        if self.cache is not None:
+            cached_common_name = self.cache.get_common_name(manifest_entry.taxon_id)
+            self.count_cache_results('taxon_id', cached_common_name is not None, cached_common_name is None)
+            if cached_common_name is not None:
+                return cached_common_name
+        self.throttle()
         url = self.build_url(manifest_entry, esearch=False)
         common_name_json = self.ncbi_search(url)
-        if 'result' in common_name_json and manifest_entry.taxon_id in common_name_json['result'] and 'scientificname' in \
-                common_name_json['result'][manifest_entry.taxon_id]:
-            ncbi_common_name = common_name_json['result'][manifest_entry.taxon_id]['scientificname']
-            ncbi_ranking = common_name_json['result'][manifest_entry.taxon_id]['rank']
+        ncbi_common_name, ncbi_ranking = NcbiQuery.extract_common_name(common_name_json, manifest_entry.taxon_id)
+        if self.cache is not None and manifest_entry.taxon_id in common_name_json.get('result', {}):
+            self.cache.put_common_name(manifest_entry.taxon_id, ncbi_common_name, ncbi_ranking)
+        return ncbi_common_name, ncbi_ranking
+
+    def query_ncbi_for_common_names(self, taxon_ids):
+        '''
+        Resolves many taxon IDs with comma-separated esummary requests of up to esummary_batch_size IDs each, kept in
+        flight together, returning a lookup table of taxon ID -> (scientific name, rank) in which taxon IDs NCBI never
+        answered for are ('__unresolved__', None)
+        '''
+        lookup = {}
+        if self.cache is not None:
+            lookup.update(self.cache.get_common_names(taxon_ids))
+        self.count_cache_results('taxon_id', len(lookup), len(set(taxon_ids)) - len(lookup))
+        numeric_ids = []
+        for taxon_id in sorted(set(taxon_ids) - set(lookup)):
+            if taxon_id.isdecimal():
+                numeric_ids.append(taxon_id)
+            else:
+                # NCBI taxon IDs are always numeric, so there is nothing to ask for
+                lookup[taxon_id] = ('__null__', None)
+
+        batches = [numeric_ids[start:start + self.esummary_batch_size]
+                   for start in range(0, len(numeric_ids), self.esummary_batch_size)]
+        summary_results = self.ncbi_search_all([self.build_batch_url(batch) for batch in batches])
+        for batch, common_name_json in zip(batches, summary_results):
+            if common_name_json is None:
+                lookup.update({taxon_id: ('__unresolved__', None) for taxon_id in batch})
+                continue
+            # only IDs NCBI answered for are cached, as a reply leaving one out says nothing about it
+            result = common_name_json.get('result', {})
+            batch_lookup = {taxon_id: NcbiQuery.extract_common_name(common_name_json, taxon_id) for taxon_id in batch
+                            if taxon_id in result}
+            if self.cache is not None and batch_lookup:
+                self.cache.put_common_names(batch_lookup)
+            lookup.update(batch_lookup)
+            lookup.update({taxon_id: ('__unresolved__', None) for taxon_id in batch if taxon_id not in result})
+        return lookup
+
+    def suggest_names(self, name):
+        '''
+        Suggests the scientific names closest to a name NCBI does not know from the cached names, indexed again whenever
+        taxa have been cached since, so suggestions cost no further NCBI queries
+        '''
+        if self.cache is None or not self.suggestion_limit:
+            return []
+        with self._suggester_lock:
+            if self._suggester is None or self._suggester_version != self.cache.version:
+                self._suggester_version = self.cache.version
+                self._suggester = NameSuggester.from_names(self.cache.scientific_names())
+        return self._suggester.suggest(name, self.suggestion_limit)
+
+    @staticmethod
+    def extract_common_name(common_name_json, taxon_id):
+        if 'result' in common_name_json and taxon_id in common_name_json['result'] and 'scientificname' in \
+                common_name_json['result'][taxon_id]:
+            ncbi_common_name = common_name_json['result'][taxon_id]['scientificname']
+            ncbi_ranking = common_name_json['result'][taxon_id]['rank']
         else:
             ncbi_common_name = '__null__'
             ncbi_ranking = None
         return ncbi_common_name, ncbi_ranking
 
     def build_url(self, manifest_entry, esearch: bool):
-        base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
-        mid_url = '.fcgi?db=taxonomy&'
-        end_url = '&retmode=json'
         if esearch:
-            url = base_url + 'esearch' + mid_url + 'field=All%20Names&term=' + manifest_entry.common_name + end_url
-        else:
-            url = base_url + 'esummary' + mid_url + 'id=' + str(manifest_entry.taxon_id) + end_url
-        return url
+            return self.build_search_url(manifest_entry.common_name)
+        return self.build_batch_url([str(manifest_entry.taxon_id)])
+
+    def build_search_url(self, name):
+        return (self.base_url + 'esearch.fcgi?db=taxonomy&field=All%20Names&term=' + name + '&retmode=json'
+                + self.credentials)
+
+    def build_names_search_url(self, names, retmax):
+        term = ' OR '.join(f'"{name}"[All Names]' for name in names)
+        return (self.base_url + 'esearch.fcgi?db=taxonomy&term=' + quote(term) + f'&retmax={retmax}&retmode=json'
+                + self.credentials)
+
+    def build_batch_url(self, taxon_ids):
+        return (self.base_url + 'esummary.fcgi?db=taxonomy&id=' + ','.join(taxon_ids) + '&retmode=json'
+                + self.credentials)
+
+    def ncbi_search_all(self, urls):
+        '''
+        Fetches every url with up to max_in_flight requests awaiting NCBI at once, so network latency overlaps while
+        the shared token bucket keeps the request rate within NCBI's limit. Results are None for urls NCBI never
+        answered, so one failing request does not lose the others
+        '''
+        if not urls:
+            return []
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        async def fetch(url, loop, executor, in_flight):
+            async with in_flight:
+                self.metrics.add_time('rate_limit_wait_seconds', await self.limiter.acquire_async())
+                try:
+                    return await loop.run_in_executor(executor, self.ncbi_search, url)
+                except NcbiUnavailableError:
+                    return None
+
+        async def fetch_all(loop):
+            in_flight = asyncio.Semaphore(self.max_in_flight)
+            with ThreadPoolExecutor(self.max_in_flight) as executor:
+                return await asyncio.gather(*[fetch(url, loop, executor, in_flight) for url in urls])
+
+        # a loop of its own rather than asyncio.run, which needs Python 3.7
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(fetch_all(loop))
+        finally:
+            loop.close()
 
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self.cache is not None:
+            self.cache.close()
 
     def ncbi_search(self, url):
-        search_session = requests.Session()
-        data = search_session.get(url)
-        if not data:
-            raise ConnectionError('Could not connect to NCBI database - Aborting')
-        return data.json()
+        '''
+        Fetches url, retrying rate limited, failed and unreachable requests and replies holding an error with backoff
+        while the retry budget lasts. Rate limited requests also lower the request rate, which recovers as requests
+        succeed again
+        '''
+        import requests
+        endpoint = url[len(self.base_url):].split('.', 1)[0]
+        for attempt in range(self.retry_policy.max_attempts):
+            retry_after = None
+            self.metrics.count('ncbi_requests', endpoint=endpoint)
+            started = time.perf_counter()
+            try:
+                data = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException:
+                data = None
+            self.metrics.observe('ncbi_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+            self.metrics.count('ncbi_responses', status='unreachable' if data is None else str(data.status_code))
+            if data:
+                try:
+                    result = data.json()
+                except ValueError:
+                    result = None
+                if NcbiQuery.answered(result):
+                    self.limiter.speed_up()
+                    return result
+                # an error page or error body sent with a 200 is retried like a failed request, and never cached
+                self.metrics.count('ncbi_invalid_responses', endpoint=endpoint)
+            elif data is not None:
+                if data.status_code not in self.retry_policy.retryable_statuses:
+                    break
+                if data.status_code == 429 and self.limiter.slow_down():
+                    self.metrics.count('rate_limit_slowdowns')
+                retry_after = RetryPolicy.parse_retry_after(data.headers.get('Retry-After'))
+            if attempt + 1 == self.retry_policy.max_attempts or not self.retry_policy.spend():
+                break
+            retry_delay = self.retry_policy.delay(attempt, retry_after)
+            self.metrics.add_time('retry_wait_seconds', retry_delay)
+            time.sleep(retry_delay)
+            self.throttle()
+        self.metrics.count('ncbi_failures', endpoint=endpoint)
+        raise NcbiUnavailableError('Could not connect to NCBI database')
 
 
-class SpreadsheetLoader:
+LOADERS = []
+
+
+def register_loader(loader_class):
+    '''Adds a loader class to the formats SpreadsheetLoader can recognise and read'''
+    LOADERS.append(loader_class)
+    return loader_class
+
 
-    def __init__(self, file):
+def find_columns(header_row):
+    '''Returns the positions of the COMMON NAME, TAXON ID and SUPPLIER SAMPLE NAME columns in header_row'''
+    headers = list(header_row)
+    columns = []
+    for header in ['COMMON NAME', 'TAXON ID', 'SUPPLIER SAMPLE NAME']:
+        if header not in headers:
+            raise ValueError(f"No '{header}' column found in the manifest header row")
+        columns.append(headers.index(header))
+    return columns
+
+
+@register_loader
+class XlsxLoader:
+    format = 'xlsx'
+    magic = b'PK\x03\x04'
+    extensions = ['.xlsx', '.xlsm']
+
+    def __init__(self, file, sheet=None):
+        import openpyxl
         self._file = file
+        self._workbook = openpyxl.load_workbook(self._file, read_only=True)
+        self._sheet = self._workbook.worksheets[0] if sheet is None else self._workbook[sheet]
+
+    def sheets(self):
+        '''Returns the names of the worksheets with a 'SANGER PLATE ID' header row'''
         try:
-            self._workbook = openpyxl.load_workbook(self._file)
-            self._sheet = self._workbook.worksheets[0]
-            self._format = 'xlsx'
-        except:
-            self._workbook = xlrd.open_workbook(self._file)
-            self._sheet = self._workbook.sheet_by_index(0)
-            self._format = 'xls'
+            sheets = []
+            for sheet in self._workbook.worksheets:
+                # read-only mode trusts the dimension a sheet records, which other tools may have got wrong
+                sheet.reset_dimensions()
+                if any(value == 'SANGER PLATE ID' for value, in sheet.iter_rows(max_col=1, values_only=True)):
+                    sheets.append(sheet.title)
+            return sheets
+        finally:
+            self._workbook.close()
 
     def load(self):
-        entries = []
-        data_row = 0
-        header_row = 0
+        '''
+        Streams the rows of a read-only workbook once, finding the 'SANGER PLATE ID' header row and its columns and then
+        yielding a ManifestEntry per sample row, so memory stays flat however many rows the sheet has
+        '''
+        columns = None
+        try:
+            # read every row whatever dimension the sheet records, as the tools writing it can get it wrong
+            self._sheet.reset_dimensions()
+            for row_number, row in enumerate(self._sheet.iter_rows(values_only=True), 1):
+                if columns is None:
+                    if row and row[0] == 'SANGER PLATE ID':
+                        columns = find_columns(row)
+                    continue
+                common_name, taxon_id, sample_id = [
+                    XlsxLoader.extract_value(row[column] if column < len(row) else None) for column in columns]
+                if sample_id != '__null__':
+                    yield ManifestEntry(sample_id, common_name, taxon_id, row_number)
+        finally:
+            self._workbook.close()
+        if columns is None:
+            raise ValueError(f"No 'SANGER PLATE ID' header row found in {self._file} [{self._sheet.title}]")
+
+    @staticmethod
+    def extract_value(value):
+        if isinstance(value, str):
+            new_data = value.strip()
+            return '__null__' if new_data == '' else new_data.replace('\xa0',' ')
+        return '__null__' if value == None else str(int(value))
+
+
+@register_loader
+class XlsLoader:
+    format = 'xls'
+    magic = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    extensions = ['.xls']
+
+    def __init__(self, file, sheet=None):
+        import xlrd
+        self._file = file
+        self._workbook = xlrd.open_workbook(self._file, on_demand=True)
+        self._sheet = self._workbook.sheet_by_index(0) if sheet is None else self._workbook.sheet_by_name(sheet)
+        self._number_cell_type = xlrd.XL_CELL_NUMBER
+
+    def sheets(self):
+        '''Returns the names of the worksheets with a 'SANGER PLATE ID' header row'''
+        return [sheet.name for sheet in self._workbook.sheets()
+                if sheet.ncols and 'SANGER PLATE ID' in sheet.col_values(0)]
+
+    def load(self):
+        header_row = None
         for row in range(self._sheet.nrows):
             if self._sheet.cell_value(row, 0) == 'SANGER PLATE ID':
-                data_row = row + 1
                 header_row = row
                 break
-
-        for column in range(self._sheet.ncols):
-            header_cell = self._sheet.cell_value(header_row, column)
-            if header_cell == 'SUPPLIER SAMPLE NAME':
-                sample_id_column = column
-            elif header_cell == 'TAXON ID':
-                taxon_id_column = column
-            elif header_cell == 'COMMON NAME':
-                common_name_column = column
-
-
-        for row in range(data_row, self._sheet.nrows):
-            common_name = self.__extract_cell_value(row, common_name_column)
-            taxon_id = self.__extract_cell_value(row, taxon_id_column)
-            sample_id = self.__extract_cell_value(row, sample_id_column)
+        if header_row is None:
+            raise ValueError(f"No 'SANGER PLATE ID' header row found in {self._file} [{self._sheet.name}]")
+        common_name_column, taxon_id_column, sample_id_column = find_columns(self._sheet.row_values(header_row))
+
+        for row in range(header_row + 1, self._sheet.nrows):
+            common_name = self.extract_value(row, common_name_column)
+            taxon_id = self.extract_value(row, taxon_id_column)
+            sample_id = self.extract_value(row, sample_id_column)
             if sample_id != '__null__':
-                entry = ManifestEntry(sample_id, common_name, taxon_id)
-                entries.append(entry)
-        return entries
+                yield ManifestEntry(sample_id, common_name, taxon_id, row + 1)
 
-
-    def __extract_cell_value(self, row, column):
-        if self._sheet.cell_type(row, column) != xlrd.XL_CELL_NUMBER:
+    def extract_value(self, row, column):
+        if self._sheet.cell_type(row, column) != self._number_cell_type:
             new_data = self._sheet.cell_value(row, column).strip()
             return '__null__' if new_data == '' else new_data.replace('\xa0',' ')
         new_data = str(int(self._sheet.cell_value(row, column)))
         return '__null__' if new_data == '' else new_data
 
-    def load_xlsx(self):
-        entries = []
-        data_row = 0
-        header_row = 0
-        for row in range(self._sheet.max_row):
-            if self._sheet.cell(row=row + 1, column=1).value == 'SANGER PLATE ID':
-                data_row = row + 2
-                header_row = row + 1
-                break
 
+@register_loader
+class CsvLoader:
+    format = 'csv'
+    magic = None
+    extensions = ['.csv', '.tsv', '.tab', '.txt']
+    directory_extensions = ['.csv', '.tsv', '.tab']
 
-        for col in range(self._sheet.max_column):
-            header_cell = self._sheet.cell(row=header_row, column=col + 1).value
-            if header_cell == 'SUPPLIER SAMPLE NAME':
-                sample_id_column = col + 1
-            elif header_cell == 'TAXON ID':
-                taxon_id_column = col + 1
-            elif header_cell == 'COMMON NAME':
-                common_name_column = col + 1
-        reads = []
-
-        for row in range(data_row, self._sheet.max_row+1):
-            common_name = self.__extract_cell_value_xlsx(row, common_name_column)
-            taxon_id = self.__extract_cell_value_xlsx(row, taxon_id_column)
-            sample_id = self.__extract_cell_value_xlsx(row, sample_id_column)
-            if sample_id != '__null__':
-                entry = ManifestEntry(sample_id, common_name, taxon_id)
-                entries.append(entry)
-        return entries
+    def __init__(self, file, sheet=None):
+        self._file = file
+        extension = os.path.splitext(self._file)[1].lower()
+        if extension in ['.tsv', '.tab']:
+            self._delimiter = '\t'
+        elif extension == '.csv':
+            self._delimiter = ','
+        else:
+            with open(self._file, newline='', encoding='utf-8-sig') as manifest:
+                sample = manifest.read(4096)
+            try:
+                self._delimiter = csv.Sniffer().sniff(sample, delimiters=',\t;').delimiter
+            except csv.Error:
+                self._delimiter = '\t' if '\t' in sample else ','
 
+    def sheets(self):
+        '''A text export holds a single sheet, which has no name'''
+        return [None]
 
-    def __extract_cell_value_xlsx(self, row, column):
-        if isinstance(self._sheet.cell(row=row, column=column).value, str):
-            new_data = self._sheet.cell(row=row, column=column).value.strip()
-            return '__null__' if new_data == '' else new_data.replace('\xa0',' ')
-        new_data = self._sheet.cell(row=row, column=column).value
-        return '__null__' if new_data == None else str(int(new_data))
+    def load(self):
+        '''
+        Streams a CSV or TSV export row by row with the csv module, finding the 'SANGER PLATE ID' header row and its
+        columns and then yielding a ManifestEntry per sample row
+        '''
+        columns = None
+        with open(self._file, newline='', encoding='utf-8-sig') as manifest:
+            for row_number, row in enumerate(csv.reader(manifest, delimiter=self._delimiter), 1):
+                if columns is None:
+                    if row and row[0] == 'SANGER PLATE ID':
+                        columns = find_columns(row)
+                    continue
+                common_name, taxon_id, sample_id = [
+                    CsvLoader.extract_value(row[column] if column < len(row) else '') for column in columns]
+                if sample_id != '__null__':
+                    yield ManifestEntry(sample_id, common_name, taxon_id, row_number)
+        if columns is None:
+            raise ValueError(f"No 'SANGER PLATE ID' header row found in {self._file}")
+
+    @staticmethod
+    def extract_value(value):
+        new_data = value.strip()
+        return '__null__' if new_data == '' else new_data.replace('\xa0',' ')
+
+
+class SpreadsheetLoader:
+    '''
+    Reads a manifest with the registered loader for its format, recognised from its leading bytes or else its extension.
+    A workbook's first worksheet is read unless another is named as sheet
+    '''
+    def __init__(self, file, metrics=None, sheet=None):
+        self._file = file
+        self._metrics = metrics or Metrics(enabled=False)
+        loader_class = SpreadsheetLoader.sniff(self._file)
+        try:
+            self._loader = loader_class(self._file) if sheet is None else loader_class(self._file, sheet)
+        except ValueError:
+            raise
+        except Exception as error:
+            raise UnreadableManifestError(f'Manifest {file} could not be read: {error}') from error
+        self._format = loader_class.format
+
+    @staticmethod
+    def sniff(file):
+        with open(file, 'rb') as manifest:
+            leading_bytes = manifest.read(8)
+        for loader_class in LOADERS:
+            if loader_class.magic and leading_bytes.startswith(loader_class.magic):
+                return loader_class
+        extension = os.path.splitext(file)[1].lower()
+        for loader_class in LOADERS:
+            if extension in loader_class.extensions:
+                return loader_class
+        raise ValueError(f'Manifest {file} is not in a recognised format')
+
+    def sheets(self):
+        '''
+        Returns the names of the worksheets holding a manifest, or [None] for formats without named sheets. Loaders
+        that cannot list sheets only have their first one read
+        '''
+        if not hasattr(self._loader, 'sheets'):
+            return [None]
+        return self._loader.sheets()
+
+    def load(self):
+        '''Returns a generator of the manifest's entries, timing how long reading them takes as the load stage'''
+        return self._metrics.timed(self.read(), 'load')
+
+    def read(self):
+        try:
+            yield from self._loader.load()
+        except ValueError:
+            raise
+        except Exception as error:
+            raise UnreadableManifestError(f'Manifest {self._file} could not be read: {error}') from error
@@ -0,0 +1,168 @@
+import json
+import time
+import threading
+from collections import Counter
+
+
+class Histogram:
+    '''Counts observations into cumulative buckets by upper bound, as Prometheus histograms do'''
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for bucket, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[bucket] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+class Metrics:
+    '''
+    Thread-safe counters, accumulated timings and latency histograms recorded through a validation run, such as the
+    time spent in each stage, the NCBI requests made and how long they took, the time spent waiting on rate limits and
+    how often the cache and memo answered. A disabled Metrics records nothing, so it can be passed around unconditionally
+    '''
+    latency_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.counters = Counter()
+        self.timings = Counter()
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name, amount=1, **labels):
+        if self.enabled and amount:
+            with self._lock:
+                self.counters[Metrics.key(name, labels)] += amount
+
+    def add_time(self, name, seconds, **labels):
+        if self.enabled:
+            with self._lock:
+                self.timings[Metrics.key(name, labels)] += seconds
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            with self._lock:
+                key = Metrics.key(name, labels)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(self.latency_buckets)
+                self.histograms[key].observe(seconds)
+
+    def stage(self, stage):
+        return StageTimer(self, stage)
+
+    def timed(self, iterable, stage):
+        '''Yields from iterable, adding the time spent producing each item to stage'''
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time('stage_seconds', time.perf_counter() - started, stage=stage)
+                return
+            self.add_time('stage_seconds', time.perf_counter() - started, stage=stage)
+            yield item
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'timings': [{'name': name, 'labels': dict(labels), 'seconds': seconds}
+                            for (name, labels), seconds in sorted(self.timings.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'count': histogram.count,
+                                'sum': histogram.sum, 'max': histogram.max,
+                                'buckets': {str(upper_bound): count for upper_bound, count
+                                            in zip(histogram.buckets, histogram.counts)}}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix='manifest_validator'):
+        '''Renders every metric in the Prometheus text exposition format'''
+        lines = []
+        metrics = self.as_dict()
+        for kind, value_field in [('counters', 'value'), ('timings', 'seconds')]:
+            for name in sorted({metric['name'] for metric in metrics[kind]}):
+                lines.append(f'# TYPE {prefix}_{name}_total counter')
+                lines.extend(f"{prefix}_{name}_total{format_labels(metric['labels'])} {metric[value_field]}"
+                             for metric in metrics[kind] if metric['name'] == name)
+        for name in sorted({metric['name'] for metric in metrics['histograms']}):
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            for metric in metrics['histograms']:
+                if metric['name'] != name:
+                    continue
+                for upper_bound, count in metric['buckets'].items():
+                    upper_bound = '+Inf' if upper_bound == 'inf' else upper_bound
+                    lines.append(f"{prefix}_{name}_bucket{format_labels(metric['labels'], le=upper_bound)} {count}")
+                lines.append(f"{prefix}_{name}_sum{format_labels(metric['labels'])} {metric['sum']}")
+                lines.append(f"{prefix}_{name}_count{format_labels(metric['labels'])} {metric['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        '''Describes the run for people: time per stage, request counts and latencies, and hit ratios'''
+        metrics = self.as_dict()
+        lines = ['Validation statistics:']
+        for metric in metrics['timings']:
+            lines.append(f"  {describe(metric)}: {metric['seconds']:.2f}s")
+        counters = {(metric['name'], tuple(sorted(metric['labels'].items()))): metric['value']
+                    for metric in metrics['counters']}
+        for metric in metrics['counters']:
+            lines.append(f"  {describe(metric)}: {metric['value']}")
+        for (name, labels), hits in counters.items():
+            if name.endswith('_hits'):
+                misses = counters.get((name[:-len('_hits')] + '_misses', labels), 0)
+                label_text = ''.join(f' {value}' for key, value in labels)
+                lines.append(f"  {name[:-len('_hits')]}{label_text} hit ratio: {hits / (hits + misses):.1%}")
+        for metric in metrics['histograms']:
+            if metric['count']:
+                lines.append(f"  {describe(metric)}: {metric['count']} requests, "
+                             f"mean {metric['sum'] / metric['count']:.3f}s, max {metric['max']:.3f}s")
+        return '\n'.join(lines)
+
+    def write(self, path, format='json'):
+        with open(path, 'w') as stats_file:
+            stats_file.write(self.to_prometheus() if format == 'prometheus' else self.to_json() + '\n')
+
+
+class StageTimer:
+    '''Adds the wall time spent inside a with block to a stage'''
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time('stage_seconds', time.perf_counter() - self.started, stage=self.stage)
+
+
+def format_labels(labels, **extra_labels):
+    labels = dict(labels, **extra_labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+def describe(metric):
+    labels = ', '.join(f'{value}' for key, value in sorted(metric['labels'].items()))
+    return metric['name'].replace('_', ' ') + (f' ({labels})' if labels else '')
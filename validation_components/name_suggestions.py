@@ -0,0 +1,99 @@
+import bisect
+from array import array
+from collections import Counter
+
+
+def trigrams(name):
+    '''The distinct three-character substrings of a lowercased name, padded so that its start and end count too'''
+    padded = f'  {name.lower()} '
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def trigram_key(trigram):
+    '''Packs a trigram into one integer, as every code point fits in 21 bits'''
+    return (ord(trigram[0]) << 42) | (ord(trigram[1]) << 21) | ord(trigram[2])
+
+
+def build_trigram_arrays(names):
+    '''
+    Indexes names by trigram, returning the sorted trigram keys, the offset of each key's postings and the postings,
+    which are the positions in names of the names holding each trigram
+    '''
+    postings_by_key = {}
+    for position, name in enumerate(names):
+        for trigram in trigrams(name):
+            key = trigram_key(trigram)
+            if key not in postings_by_key:
+                postings_by_key[key] = array('I')
+            postings_by_key[key].append(position)
+    keys = array('Q', sorted(postings_by_key))
+    offsets = array('Q', [0])
+    postings = array('I')
+    for key in keys:
+        postings.extend(postings_by_key[key])
+        offsets.append(len(postings))
+    return keys, offsets, postings
+
+
+def edit_distance(first, second, limit):
+    '''The Levenshtein distance between two strings, or limit + 1 as soon as it is certain to exceed limit'''
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous_row = list(range(len(second) + 1))
+    for row, first_character in enumerate(first, 1):
+        current_row = [row]
+        for column, second_character in enumerate(second, 1):
+            current_row.append(min(previous_row[column] + 1, current_row[column - 1] + 1,
+                                   previous_row[column - 1] + (first_character != second_character)))
+        if min(current_row) > limit:
+            return limit + 1
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class NameSuggester:
+    '''
+    Finds the scientific names closest to a name that does not exist, from a trigram index over known names. Names
+    sharing the most trigrams with it are ranked by edit distance, so a suggestion takes milliseconds and no queries.
+    Trigrams held by more than max_postings names say little about a name and are skipped while rarer ones remain
+    '''
+    max_postings = 100000
+    candidates = 50
+
+    def __init__(self, keys, offsets, postings, named_taxon):
+        self._keys = keys
+        self._offsets = offsets
+        self._postings = postings
+        self._named_taxon = named_taxon
+
+    @classmethod
+    def from_names(cls, named_taxa):
+        '''Indexes a list of (scientific name, taxon ID) pairs in memory'''
+        named_taxa = list(named_taxa)
+        keys, offsets, postings = build_trigram_arrays([name for name, taxon_id in named_taxa])
+        return cls(keys, offsets, postings, named_taxa.__getitem__)
+
+    def postings(self, trigram):
+        key = trigram_key(trigram)
+        position = bisect.bisect_left(self._keys, key)
+        if position == len(self._keys) or self._keys[position] != key:
+            return []
+        return self._postings[self._offsets[position]:self._offsets[position + 1]]
+
+    def suggest(self, name, limit=3):
+        '''Returns up to limit (scientific name, taxon ID) pairs within a few edits of name, closest first'''
+        all_postings = sorted((self.postings(trigram) for trigram in trigrams(name)), key=len)
+        rare_postings = [postings for postings in all_postings if len(postings) <= self.max_postings]
+        shared_trigrams = Counter()
+        for postings in rare_postings or all_postings[:1]:
+            shared_trigrams.update(postings)
+
+        max_distance = max(2, len(name) // 4)
+        suggestions = {}
+        for position, shared in shared_trigrams.most_common(self.candidates):
+            candidate_name, taxon_id = self._named_taxon(position)
+            distance = edit_distance(name.lower(), candidate_name.lower(), max_distance)
+            if distance <= max_distance and candidate_name not in suggestions:
+                suggestions[candidate_name] = (distance, -shared, taxon_id)
+        ranked = sorted(suggestions.items(), key=lambda suggestion: suggestion[1])
+        return [(candidate_name, taxon_id) for candidate_name, (distance, shared, taxon_id) in ranked[:limit]]
@@ -0,0 +1,119 @@
+import time
+import random
+import threading
+from datetime import datetime, timezone
+
+
+class TokenBucket:
+    '''
+    A token bucket refilled at rate tokens per second and holding at most capacity tokens. Each request takes a token,
+    so callers in any number of threads or coroutines sharing one bucket stay within rate requests per second together.
+    The rate can be lowered while the server is rate limiting requests and recovers towards its initial rate afterwards
+    '''
+    slow_down_factor = 0.5
+    slow_down_interval = 1.0
+    recovery_step = 0.05
+
+    def __init__(self, rate, capacity=1, min_rate=None):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min(rate, 1) if min_rate is None else min_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.slowed_at = None
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        '''Takes a token, returning the number of seconds the caller has to wait before it may be used'''
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def slow_down(self):
+        '''
+        Lowers the rate by slow_down_factor, at most once per slow_down_interval so that a burst of rate limited requests
+        already in flight only counts once, returning whether the rate was lowered
+        '''
+        with self._lock:
+            now = time.monotonic()
+            if self.rate <= self.min_rate or (self.slowed_at is not None
+                                              and now - self.slowed_at < self.slow_down_interval):
+                return False
+            self.rate = max(self.min_rate, self.rate * self.slow_down_factor)
+            self.slowed_at = now
+            return True
+
+    def speed_up(self):
+        '''Raises the rate by recovery_step of the initial rate after a successful request, up to the initial rate'''
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery_step)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        import asyncio
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RetryPolicy:
+    '''
+    Exponential backoff with full jitter for transient NCBI failures, honouring any Retry-After the server sends and
+    drawing every retry from one budget, so a bad spell at NCBI cannot multiply the traffic of a whole run. Given a
+    refill_interval, a spent budget refills gradually over that many seconds, as a long-running daemon needs
+    '''
+    retryable_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30, budget=100, refill_interval=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.remaining = budget
+        self.refill_interval = refill_interval
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def spend(self):
+        '''Takes a retry from the budget, returning False once the budget is exhausted'''
+        with self._lock:
+            now = time.monotonic()
+            if self.refill_interval:
+                self.remaining = min(self.budget,
+                                     self.remaining + (now - self.updated) * self.budget / self.refill_interval)
+            self.updated = now
+            if self.remaining < 1:
+                return False
+            self.remaining -= 1
+            return True
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def parse_retry_after(value):
+        '''Converts a Retry-After header, given either in seconds or as an HTTP date, into seconds to wait'''
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        import email.utils
+        try:
+            retry_time = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (retry_time - datetime.now(timezone.utc)).total_seconds())
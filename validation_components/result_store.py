@@ -0,0 +1,62 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from validation_components.manifest_querying import EntryError
+
+
+class ResultStore:
+    '''
+    The verdicts of a previous validation, keyed by a fingerprint of each row's sample ID, common name and taxon ID, so
+    a resubmitted manifest only has the rows whose taxonomy changed checked again. Verdicts are only reused when they
+    were reached with the same resolver and within ttl_days, and new verdicts are added to the file once a run finishes
+    '''
+    format_version = 2
+
+    def __init__(self, path, resolver='', ttl_days=30):
+        self.path = path
+        self.resolver = resolver
+        self.ttl = ttl_days * 86400
+        self.previous = self.read()
+        self.results = {}
+
+    @staticmethod
+    def key(manifest_entry):
+        fields = [manifest_entry.sample_id, manifest_entry.common_name, str(manifest_entry.taxon_id)]
+        return hashlib.blake2b('\x1f'.join(fields).encode('utf-8'), digest_size=16).hexdigest()
+
+    def read(self):
+        '''Returns the verdicts saved at path, or none if there are none that can be trusted'''
+        try:
+            with open(self.path) as results_file:
+                saved = json.load(results_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(saved, dict) or saved.get('format') != self.format_version \
+                or saved.get('resolver') != self.resolver or saved.get('saved_at', 0) < time.time() - self.ttl:
+            return {}
+        return saved.get('rows', {})
+
+    def lookup(self, manifest_entry):
+        '''Returns the errors previously found for an unchanged row, or None if the row has to be checked'''
+        saved_errors = self.previous.get(ResultStore.key(manifest_entry))
+        if saved_errors is None:
+            return None
+        # the row may have moved since, so its record takes the current row number
+        return [EntryError(message, dict(record, row=manifest_entry.row)) for message, record in saved_errors]
+
+    def record(self, manifest_entry, errors, reusable=True):
+        '''Keeps the errors found for a row, to be saved for the next run only if they are reusable'''
+        if reusable:
+            self.results[ResultStore.key(manifest_entry)] = [[str(error), getattr(error, 'record', {})]
+                                                             for error in errors]
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as results_file:
+            # rows a run stopped before reaching keep their earlier verdicts
+            json.dump({'format': self.format_version, 'resolver': self.resolver, 'saved_at': time.time(),
+                       'rows': dict(self.previous, **self.results)}, results_file)
+        os.replace(results_file.name, self.path)
@@ -0,0 +1,116 @@
+import os
+import json
+import tempfile
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from socketserver import ThreadingMixIn
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from validation_components.manifest_querying import SpreadsheetLoader
+from validation_components.validation import build_connecter, iter_errors
+from validation_components.metrics import Metrics
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    '''
+    Accepts a manifest as the raw body of a POST to /validate, naming the upload with a filename query parameter so
+    its format can be recognised, and answers with the validation results as JSON. GET /metrics exposes the statistics
+    of every validation so far in the Prometheus text format
+    '''
+    max_upload_size = 100 * 1024 * 1024
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        elif urlsplit(self.path).path == '/metrics':
+            self.send_content(200, self.server.metrics.to_prometheus().encode('utf-8'),
+                              'text/plain; version=0.0.4')
+        else:
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/validate':
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            upload_size = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            upload_size = -1
+        if upload_size < 0:
+            self.send_json(400, {'error': 'Content-Length must be a whole number of bytes'})
+            return
+        if upload_size == 0:
+            self.send_json(400, {'error': 'No manifest was uploaded'})
+            return
+        if upload_size > self.max_upload_size:
+            self.send_json(413, {'error': f'Manifests are limited to {self.max_upload_size} bytes'})
+            return
+        file_name = os.path.basename(parse_qs(url.query).get('filename', ['manifest'])[0])
+        if file_name in ['', '.', '..']:
+            file_name = 'manifest'
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = os.path.join(directory, file_name)
+            try:
+                with open(manifest, 'wb') as upload:
+                    upload.write(self.rfile.read(upload_size))
+            except OSError:
+                self.send_json(400, {'error': f'The upload could not be stored as {file_name}'})
+                return
+            metrics = self.server.metrics
+            try:
+                with metrics.stage('total'):
+                    errors = list(iter_errors(SpreadsheetLoader(manifest, metrics).load(), self.server.connecter,
+                                              metrics=metrics))
+            except ValueError as error:
+                metrics.count('validations', outcome='unreadable')
+                # errors name the upload as the client did rather than by its path on the server
+                self.send_json(400, {'error': str(error).replace(manifest, file_name)})
+                return
+            except Exception as error:
+                metrics.count('validations', outcome='failed')
+                self.log_error('Validating %s failed: %r', file_name, error)
+                self.send_json(500, {'error': f'Validation failed: {error}'.replace(manifest, file_name)})
+                return
+        metrics.count('validations', outcome='invalid' if errors else 'valid')
+        self.send_json(200, {'manifest': file_name, 'valid': not errors, 'errors': errors})
+
+    def send_json(self, status, body):
+        self.send_content(status, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def send_content(self, status, content, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class ValidationServer(ThreadingMixIn, HTTPServer):
+    '''
+    A long-running validation daemon. Every request shares one resolver, so the taxonomy cache, the pooled NCBI
+    connections and the rate limiter stay warm between uploads and concurrent uploads stay within NCBI's limit together
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, connecter, handler=ValidationRequestHandler, metrics=None):
+        super().__init__(address, handler)
+        self.connecter = connecter
+        self.metrics = metrics or Metrics()
+
+
+def serve(arguments: argparse.Namespace, retry_refill_interval=300):
+    if getattr(arguments, 'no_cache', False) and not getattr(arguments, 'taxdump', None):
+        # keep results warm in memory for the life of the daemon without touching the persistent cache
+        arguments.no_cache = False
+        arguments.cache_path = ':memory:'
+    # the retry budget of a daemon refills over time, so retries spent on earlier uploads are not lost for good
+    arguments.retry_refill_interval = retry_refill_interval
+    metrics = Metrics()
+    with build_connecter(arguments, metrics) as connecter, \
+            ValidationServer((arguments.host, arguments.port), connecter, metrics=metrics) as server:
+        host, port = server.server_address[:2]
+        print(f'Validating manifests posted to http://{host}:{port}/validate', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import mmap
+import bisect
+import hashlib
+from array import array
+from validation_components.manifest_querying import ManifestEntry
+from validation_components.name_suggestions import NameSuggester, build_trigram_arrays
+
+INDEX_VERSION = 2
+
+
+def read_dmp(path):
+    '''Yields the fields of each line of an NCBI taxdump .dmp file, which are separated by tab-pipe-tab'''
+    with open(path, encoding='utf-8') as dmp_file:
+        for line in dmp_file:
+            yield line.rstrip('\n').rstrip('\t|').split('\t|\t')
+
+
+def name_hash(name):
+    '''A stable 64 bit hash of a name, matching NCBI's case-insensitive name search'''
+    return int.from_bytes(hashlib.blake2b(name.lower().encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def compile_taxdump(dump_directory, index_directory):
+    '''
+    Compiles names.dmp and nodes.dmp from an NCBI taxdump into a compact index directory of flat binary arrays which
+    TaxdumpQuery memory-maps, so the one-off parse of the dump is never repeated. A trigram index of the scientific
+    names is included for suggesting names in place of misspelt ones
+    '''
+    ranks = {}
+    rank_codes = {}
+    for fields in read_dmp(os.path.join(dump_directory, 'nodes.dmp')):
+        rank = fields[2]
+        if rank not in rank_codes:
+            rank_codes[rank] = len(rank_codes)
+        ranks[int(fields[0])] = rank_codes[rank]
+
+    scientific_names = {}
+    name_taxa = {}
+    for fields in read_dmp(os.path.join(dump_directory, 'names.dmp')):
+        taxon_id = int(fields[0])
+        if fields[3] == 'scientific name':
+            scientific_names[taxon_id] = fields[1]
+        hashed_name = name_hash(fields[1])
+        if name_taxa.get(hashed_name, taxon_id) != taxon_id:
+            # the name is shared by several taxa, so NCBI cannot resolve it to a single ID
+            taxon_id = -1
+        name_taxa[hashed_name] = taxon_id
+
+    os.makedirs(index_directory, exist_ok=True)
+    taxa = array('I', sorted(scientific_names))
+    taxon_ranks = array('B', (ranks.get(taxon_id, 0) for taxon_id in taxa))
+    offsets = array('Q', [0])
+    with open(os.path.join(index_directory, 'names.txt'), 'wb') as names_file:
+        for taxon_id in taxa:
+            encoded_name = scientific_names[taxon_id].encode('utf-8')
+            names_file.write(encoded_name)
+            offsets.append(offsets[-1] + len(encoded_name))
+    hashes = array('Q', sorted(name_taxa))
+    hashed_taxa = array('i', (name_taxa[hashed_name] for hashed_name in hashes))
+    trigram_keys, trigram_offsets, trigram_postings = build_trigram_arrays(
+        [scientific_names[taxon_id] for taxon_id in taxa])
+
+    for file_name, values in [('taxa.bin', taxa), ('ranks.bin', taxon_ranks), ('offsets.bin', offsets),
+                              ('hashes.bin', hashes), ('hashed_taxa.bin', hashed_taxa),
+                              ('trigram_keys.bin', trigram_keys), ('trigram_offsets.bin', trigram_offsets),
+                              ('trigram_postings.bin', trigram_postings)]:
+        with open(os.path.join(index_directory, file_name), 'wb') as index_file:
+            values.tofile(index_file)
+    with open(os.path.join(index_directory, 'meta.json'), 'w') as meta_file:
+        json.dump({'version': INDEX_VERSION, 'byteorder': sys.byteorder,
+                   'ranks': sorted(rank_codes, key=rank_codes.get)}, meta_file)
+
+
+class TaxdumpQuery:
+    '''
+    Answers the same questions as NcbiQuery from a compiled local taxdump index, without any network access
+    '''
+    def __init__(self, index_directory, suggestion_limit=3):
+        self.suggestion_limit = suggestion_limit
+        with open(os.path.join(index_directory, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        if meta['version'] != INDEX_VERSION or meta['byteorder'] != sys.byteorder:
+            raise ValueError(f'Taxdump index {index_directory} is incompatible - please rebuild it')
+        self._ranks = meta['ranks']
+        self._maps = []
+        self._taxa = self.map_file(index_directory, 'taxa.bin', 'I')
+        self._taxon_ranks = self.map_file(index_directory, 'ranks.bin', 'B')
+        self._offsets = self.map_file(index_directory, 'offsets.bin', 'Q')
+        self._names = self.map_file(index_directory, 'names.txt', 'B')
+        self._hashes = self.map_file(index_directory, 'hashes.bin', 'Q')
+        self._hashed_taxa = self.map_file(index_directory, 'hashed_taxa.bin', 'i')
+        self._trigram_keys = self.map_file(index_directory, 'trigram_keys.bin', 'Q')
+        self._trigram_offsets = self.map_file(index_directory, 'trigram_offsets.bin', 'Q')
+        self._trigram_postings = self.map_file(index_directory, 'trigram_postings.bin', 'I')
+        self._suggester = NameSuggester(self._trigram_keys, self._trigram_offsets, self._trigram_postings,
+                                        self.named_taxon)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def map_file(self, index_directory, file_name, type_code):
+        with open(os.path.join(index_directory, file_name), 'rb') as index_file:
+            if os.fstat(index_file.fileno()).st_size == 0:
+                return array(type_code)
+            mapped_file = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped_file)
+        return memoryview(mapped_file).cast(type_code)
+
+    def lookup_taxon(self, taxon_id):
+        if not taxon_id.isdecimal():
+            return '__null__', None
+        position = bisect.bisect_left(self._taxa, int(taxon_id))
+        if position == len(self._taxa) or self._taxa[position] != int(taxon_id):
+            return '__null__', None
+        return self.scientific_name(position), self._ranks[self._taxon_ranks[position]]
+
+    def scientific_name(self, position):
+        return bytes(self._names[self._offsets[position]:self._offsets[position + 1]]).decode('utf-8')
+
+    def named_taxon(self, position):
+        return self.scientific_name(position), str(self._taxa[position])
+
+    def lookup_name(self, name):
+        hashed_name = name_hash(name)
+        position = bisect.bisect_left(self._hashes, hashed_name)
+        if position == len(self._hashes) or self._hashes[position] != hashed_name or self._hashed_taxa[position] < 0:
+            return '__null__'
+        return str(self._hashed_taxa[position])
+
+    def query_ncbi_for_taxon_id(self, manifest_entry: ManifestEntry):
+        return self.lookup_name(manifest_entry.common_name)
+
+    def query_ncbi_for_taxon_ids(self, names):
+        return {name: self.lookup_name(name) for name in set(names)}
+
+    def query_ncbi_for_common_name(self, manifest_entry: ManifestEntry):
+        return self.lookup_taxon(manifest_entry.taxon_id)
+
+    def query_ncbi_for_common_names(self, taxon_ids):
+        return {taxon_id: self.lookup_taxon(taxon_id) for taxon_id in set(taxon_ids)}
+
+    def suggest_names(self, name):
+        return self._suggester.suggest(name, self.suggestion_limit) if self.suggestion_limit else []
+
+    def close(self):
+        for view in [self._taxa, self._taxon_ranks, self._offsets, self._names, self._hashes, self._hashed_taxa,
+                     self._trigram_keys, self._trigram_offsets, self._trigram_postings]:
+            if isinstance(view, memoryview):
+                view.release()
+        for mapped_file in self._maps:
+            mapped_file.close()
+        self._maps = []
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class TaxonomyCache:
+    '''
+    A persistent SQLite store of taxon ID -> (scientific name, rank) and name -> taxon ID results, shared across runs
+    so repeat validations need not query NCBI for organisms that have already been resolved
+    '''
+    default_path = os.path.join(os.path.expanduser('~'), '.cache', 'manifest-validator', 'taxonomy.sqlite')
+    # bumped whenever taxa are stored, so indexes built from scientific_names() can tell they are out of date
+    version = 0
+
+    def __init__(self, path=None, ttl_days=30, max_entries=100000, refresh=False):
+        self.path = path or os.environ.get('MANIFEST_VALIDATOR_CACHE', TaxonomyCache.default_path)
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.refresh = refresh
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS taxa '
+                                     '(taxon_id TEXT PRIMARY KEY, name TEXT, rank TEXT, stored_at REAL, used_at REAL)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS names '
+                                     '(name TEXT PRIMARY KEY, taxon_id TEXT, stored_at REAL, used_at REAL)')
+            self._connection.execute('DELETE FROM taxa WHERE stored_at < ?', (self.expiry_cutoff(),))
+            self._connection.execute('DELETE FROM names WHERE stored_at < ?', (self.expiry_cutoff(),))
+
+    def expiry_cutoff(self):
+        return time.time() - self.ttl
+
+    def get_common_names(self, taxon_ids):
+        '''Returns {taxon_id: (scientific name, rank)} for every fresh cached taxon ID in taxon_ids'''
+        found = {}
+        if self.refresh:
+            return found
+        with self._lock, self._connection:
+            for taxon_id in set(taxon_ids):
+                row = self._connection.execute('SELECT name, rank FROM taxa WHERE taxon_id = ? AND stored_at >= ?',
+                                               (taxon_id, self.expiry_cutoff())).fetchone()
+                if row is not None:
+                    found[taxon_id] = (row[0], row[1])
+                    self._connection.execute('UPDATE taxa SET used_at = ? WHERE taxon_id = ?', (time.time(), taxon_id))
+        return found
+
+    def put_common_names(self, lookup):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO taxa VALUES (?, ?, ?, ?, ?)',
+                                         [(taxon_id, name, rank, now, now)
+                                          for taxon_id, (name, rank) in lookup.items()])
+            self.evict('taxa', 'taxon_id')
+            self.version += 1
+
+    def get_common_name(self, taxon_id):
+        return self.get_common_names([taxon_id]).get(taxon_id)
+
+    def put_common_name(self, taxon_id, name, rank):
+        self.put_common_names({taxon_id: (name, rank)})
+
+    def get_taxon_ids(self, names):
+        '''Returns {name: taxon ID} for every fresh cached name in names'''
+        found = {}
+        if self.refresh:
+            return found
+        with self._lock, self._connection:
+            for name in set(names):
+                row = self._connection.execute('SELECT taxon_id FROM names WHERE name = ? AND stored_at >= ?',
+                                               (name, self.expiry_cutoff())).fetchone()
+                if row is not None:
+                    found[name] = row[0]
+                    self._connection.execute('UPDATE names SET used_at = ? WHERE name = ?', (time.time(), name))
+        return found
+
+    def put_taxon_ids(self, lookup):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)',
+                                         [(name, taxon_id, now, now) for name, taxon_id in lookup.items()])
+            self.evict('names', 'name')
+
+    def get_taxon_id(self, name):
+        return self.get_taxon_ids([name]).get(name)
+
+    def put_taxon_id(self, name, taxon_id):
+        self.put_taxon_ids({name: taxon_id})
+
+    def scientific_names(self):
+        '''Returns (scientific name, taxon ID) for every fresh cached taxon ID that exists'''
+        with self._lock, self._connection:
+            return self._connection.execute("SELECT name, taxon_id FROM taxa WHERE name != '__null__' "
+                                            "AND name != '__unresolved__' AND stored_at >= ?",
+                                            (self.expiry_cutoff(),)).fetchall()
+
+    def evict(self, table, key):
+        '''Drops the least recently used rows of table once it holds more than max_entries'''
+        self._connection.execute(f'DELETE FROM {table} WHERE {key} IN '
+                                 f'(SELECT {key} FROM {table} ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                                 (self.max_entries,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import sys
+import tempfile
+import subprocess
+
+from unittest.mock import patch
+from validation_components import cli
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def test_validation_defaults(self):
+        arguments = cli.build_parser().parse_args(['manifest.xlsx'])
+        self.assertEqual(arguments.spreadsheet, ['manifest.xlsx'])
+        self.assertIsNone(arguments.taxdump)
+        self.assertFalse(arguments.no_cache)
+
+    def test_cache_switches_are_exclusive(self):
+        with patch('sys.stderr'), self.assertRaises(SystemExit):
+            cli.build_parser().parse_args(['manifest.xlsx', '--no-cache', '--refresh-cache'])
+
+    def test_error_limit_and_sample_must_be_positive(self):
+        arguments = cli.build_parser().parse_args(['manifest.xlsx', '--max-errors', '2', '--sample', '1'])
+        self.assertEqual((arguments.max_errors, arguments.sample), (2, 1))
+        for option, value in [('--max-errors', '0'), ('--sample', '-3'), ('--sample', 'some')]:
+            with patch('sys.stderr'), self.assertRaises(SystemExit):
+                cli.build_parser().parse_args(['manifest.xlsx', option, value])
+
+    def test_workers_must_be_positive(self):
+        self.assertEqual(cli.build_parser().parse_args(['manifest.xlsx', '--workers', '2']).workers, 2)
+        for value in ['0', '-1']:
+            with patch('sys.stderr'), self.assertRaises(SystemExit):
+                cli.build_parser().parse_args(['manifest.xlsx', '--workers', value])
+
+    def test_max_attempts_must_be_positive(self):
+        self.assertEqual(cli.build_parser().parse_args(['manifest.xlsx', '--max-attempts', '1']).max_attempts, 1)
+        with patch('sys.stderr'), self.assertRaises(SystemExit):
+            cli.build_parser().parse_args(['manifest.xlsx', '--max-attempts', '0'])
+
+    def test_suggestions_must_not_be_negative(self):
+        self.assertEqual(cli.build_parser().parse_args(['manifest.xlsx', '--suggestions', '0']).suggestions, 0)
+        with patch('sys.stderr'), self.assertRaises(SystemExit):
+            cli.build_parser().parse_args(['manifest.xlsx', '--suggestions', '-1'])
+
+    @patch('validation_components.cli.run_validation')
+    def test_main_runs_validation(self, mocked_validation):
+        cli.main(['manifest.xlsx', '--taxdump', 'index'])
+        self.assertEqual(mocked_validation.call_args[0][0].taxdump, 'index')
+
+    @patch('validation_components.taxdump.compile_taxdump')
+    @patch('builtins.print')
+    def test_main_dispatches_build_taxdump(self, mocked_print, mocked_compile):
+        cli.main(['build-taxdump', 'dump', 'index'])
+        mocked_compile.assert_called_once_with('dump', 'index')
+
+
+    @patch('validation_components.warm_cache.warm_cache')
+    def test_main_dispatches_warm_cache(self, mocked_warm_cache):
+        cli.main(['warm-cache', '--taxon-ids', 'taxa.txt', '--api-key', 'secret'])
+        self.assertEqual(mocked_warm_cache.call_args[0][0].taxon_ids, ['taxa.txt'])
+        with self.assertRaises(SystemExit):
+            cli.main(['warm-cache'])
+
+    def test_reading_csv_does_not_import_heavy_dependencies(self):
+        script = ('import sys\n'
+                  'from validation_components.validation import SpreadsheetLoader\n'
+                  'list(SpreadsheetLoader(sys.argv[1]).load())\n'
+                  "print(' '.join(sorted({'xlrd', 'openpyxl', 'requests', 'multiprocessing'} & set(sys.modules))))")
+        repository = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = os.path.join(directory, 'manifest.csv')
+            with open(manifest, 'w') as manifest_file:
+                manifest_file.write('SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\n'
+                                    'plate1,sample1,7955,Danio rerio\n')
+            imported = subprocess.run([sys.executable, '-c', script, manifest], stdout=subprocess.PIPE,
+                                      universal_newlines=True, check=True,
+                                      env=dict(os.environ, PYTHONPATH=repository)).stdout.strip()
+        self.assertEqual(imported, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import pickle
+
+from validation_components.manifest_querying import ManifestEntry
+from validation_components.entry_store import EntryStore
+
+
+class TestEntryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = [ManifestEntry('sample1', 'Danio rerio', '7955', 3),
+                        ManifestEntry('sample2', 'Homo sapiens', '9606', 4),
+                        ManifestEntry('sample3', 'Danio rerio', '7955', 5),
+                        ManifestEntry('sample4', 'Danio rerio', '__null__')]
+        self.store = EntryStore(self.entries)
+
+    @staticmethod
+    def values(entries):
+        return [(entry.sample_id, entry.common_name, entry.taxon_id, entry.row) for entry in entries]
+
+    def test_rows_read_back_in_order(self):
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(self.values(self.store), self.values(self.entries))
+        self.assertEqual(self.values([self.store[2]]), [('sample3', 'Danio rerio', '7955', 5)])
+
+    def test_each_distinct_pair_is_kept_once(self):
+        self.assertEqual(self.store.pairs, [('Danio rerio', '7955'), ('Homo sapiens', '9606'),
+                                            ('Danio rerio', '__null__')])
+        self.assertEqual(list(self.store.pair_positions), [0, 1, 0, 2])
+        self.assertEqual([entry.sample_id for entry in self.store.distinct_entries()], ['sample1', 'sample2', 'sample4'])
+
+    def test_stores_survive_being_sent_between_processes(self):
+        store = pickle.loads(pickle.dumps(self.store))
+        self.assertEqual(self.values(store), self.values(self.entries))
+        store.extend([ManifestEntry('sample5', 'Homo sapiens', '9606', 6)])
+        self.assertEqual(len(store.pairs), 3)
+
+    def test_entries_have_no_instance_dictionary(self):
+        entry = self.store[0]
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertEqual(entry.query_id, 'Danio rerio7955')
+
+
+if __name__ == '__main__':
+    unittest.main()
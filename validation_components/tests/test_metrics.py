@@ -0,0 +1,71 @@
+import unittest
+import json
+import os
+import tempfile
+
+from validation_components.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_counters_are_kept_per_label(self):
+        self.metrics.count('ncbi_requests', endpoint='esearch')
+        self.metrics.count('ncbi_requests', 2, endpoint='esearch')
+        self.metrics.count('ncbi_requests', endpoint='esummary')
+        self.assertEqual(self.metrics.counters[('ncbi_requests', (('endpoint', 'esearch'),))], 3)
+        self.assertEqual(self.metrics.counters[('ncbi_requests', (('endpoint', 'esummary'),))], 1)
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = Metrics(enabled=False)
+        metrics.count('ncbi_requests')
+        metrics.observe('ncbi_request_seconds', 0.2)
+        with metrics.stage('load'):
+            pass
+        self.assertEqual(list(metrics.timed([1, 2], 'load')), [1, 2])
+        self.assertEqual(metrics.as_dict(), {'counters': [], 'timings': [], 'histograms': []})
+
+    def test_timed_adds_time_producing_items_to_the_stage(self):
+        self.assertEqual(list(self.metrics.timed(iter([1, 2, 3]), 'load')), [1, 2, 3])
+        self.assertIn(('stage_seconds', (('stage', 'load'),)), self.metrics.timings)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in [0.01, 0.2, 3]:
+            self.metrics.observe('ncbi_request_seconds', seconds, endpoint='esearch')
+        histogram = self.metrics.as_dict()['histograms'][0]
+        self.assertEqual(histogram['count'], 3)
+        self.assertEqual(histogram['buckets']['0.05'], 1)
+        self.assertEqual(histogram['buckets']['0.25'], 2)
+        self.assertEqual(histogram['buckets']['inf'], 3)
+        self.assertEqual(histogram['max'], 3)
+
+    def test_prometheus_text(self):
+        self.metrics.count('ncbi_requests', endpoint='esearch')
+        self.metrics.add_time('rate_limit_wait_seconds', 1.5)
+        self.metrics.observe('ncbi_request_seconds', 0.2, endpoint='esearch')
+        lines = self.metrics.to_prometheus().splitlines()
+        self.assertIn('# TYPE manifest_validator_ncbi_requests_total counter', lines)
+        self.assertIn('manifest_validator_ncbi_requests_total{endpoint="esearch"} 1', lines)
+        self.assertIn('manifest_validator_rate_limit_wait_seconds_total 1.5', lines)
+        self.assertIn('manifest_validator_ncbi_request_seconds_bucket{endpoint="esearch",le="+Inf"} 1', lines)
+        self.assertIn('manifest_validator_ncbi_request_seconds_count{endpoint="esearch"} 1', lines)
+
+    def test_summary_reports_hit_ratios(self):
+        self.metrics.count('memo_hits', 3)
+        self.metrics.count('memo_misses', 1)
+        self.assertIn('memo hit ratio: 75.0%', self.metrics.summary())
+
+    def test_write_json(self):
+        self.metrics.count('manifest_rows', 10)
+        with tempfile.TemporaryDirectory() as directory:
+            stats_file = os.path.join(directory, 'stats.json')
+            self.metrics.write(stats_file)
+            with open(stats_file) as written:
+                self.assertEqual(json.load(written)['counters'],
+                                 [{'name': 'manifest_rows', 'labels': {}, 'value': 10}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from validation_components.name_suggestions import NameSuggester, edit_distance, trigrams
+
+
+class TestNameSuggester(unittest.TestCase):
+
+    def setUp(self):
+        self.suggester = NameSuggester.from_names([('Danio rerio', '7955'), ('Danio aesculapii', '1094316'),
+                                                    ('Homo sapiens', '9606'), ('Mus musculus', '10090'),
+                                                    ('Mus spretus', '10096')])
+
+    def test_trigrams_are_padded_and_lowercased(self):
+        self.assertEqual(trigrams('Mus'), {'  m', ' mu', 'mus', 'us '})
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance('danio reri', 'danio rerio', 3), 1)
+        self.assertEqual(edit_distance('homo sapiens', 'homo spaiens', 3), 2)
+        self.assertEqual(edit_distance('mus', 'danio rerio', 2), 3)
+
+    def test_closest_names_come_first(self):
+        self.assertEqual(self.suggester.suggest('Mus muscluus'), [('Mus musculus', '10090')])
+        self.assertEqual(self.suggester.suggest('danio rerio', limit=1), [('Danio rerio', '7955')])
+
+    def test_distant_names_are_not_suggested(self):
+        self.assertEqual(self.suggester.suggest('Escherichia coli'), [])
+
+    def test_common_trigrams_are_skipped(self):
+        self.suggester.max_postings = 1
+        self.assertEqual(self.suggester.suggest('Homo sapien'), [('Homo sapiens', '9606')])
+
+    def test_empty_index_suggests_nothing(self):
+        self.assertEqual(NameSuggester.from_names([]).suggest('Danio rerio'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import asyncio
+
+from unittest.mock import patch
+from validation_components.rate_limiting import TokenBucket, RetryPolicy
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    @patch('time.monotonic', return_value=100.0)
+    def setUp(self, mocked_clock):
+        self.bucket = TokenBucket(rate=3)
+
+    @patch('time.sleep')
+    @patch('time.monotonic', return_value=100.0)
+    def test_first_request_does_not_wait(self, mocked_clock, mocked_sleep):
+        self.bucket.acquire()
+        mocked_sleep.assert_not_called()
+
+    @patch('time.sleep')
+    @patch('time.monotonic', return_value=100.0)
+    def test_requests_are_spaced_at_the_rate(self, mocked_clock, mocked_sleep):
+        waits = [self.bucket.reserve() for request in range(3)]
+        self.assertEqual(waits[0], 0)
+        self.assertAlmostEqual(waits[1], 1 / 3)
+        self.assertAlmostEqual(waits[2], 2 / 3)
+
+    @patch('time.sleep')
+    def test_enough_time_passed_does_not_wait(self, mocked_sleep):
+        with patch('time.monotonic', return_value=100.0):
+            self.bucket.acquire()
+        with patch('time.monotonic', return_value=100.4):
+            self.bucket.acquire()
+        mocked_sleep.assert_not_called()
+
+    @patch('time.sleep')
+    def test_not_enough_time_passed_waits(self, mocked_sleep):
+        with patch('time.monotonic', return_value=100.0):
+            self.bucket.acquire()
+        with patch('time.monotonic', return_value=100.1):
+            self.bucket.acquire()
+        mocked_sleep.assert_called_once()
+        self.assertAlmostEqual(mocked_sleep.call_args[0][0], 1 / 3 - 0.1)
+
+    @patch('time.monotonic', return_value=100.0)
+    def test_acquire_async_waits_in_the_event_loop(self, mocked_clock):
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+
+        async def acquire_twice():
+            await self.bucket.acquire_async()
+            await self.bucket.acquire_async()
+
+        loop = asyncio.new_event_loop()
+        try:
+            with patch('asyncio.sleep', sleep):
+                loop.run_until_complete(acquire_twice())
+        finally:
+            loop.close()
+        self.assertEqual(len(sleeps), 1)
+        self.assertAlmostEqual(sleeps[0], 1 / 3)
+
+    def test_slow_down_halves_the_rate_once_per_interval(self):
+        bucket = TokenBucket(rate=10)
+        with patch('time.monotonic', return_value=100.0):
+            self.assertTrue(bucket.slow_down())
+            self.assertFalse(bucket.slow_down())
+        self.assertEqual(bucket.rate, 5)
+        with patch('time.monotonic', return_value=101.5):
+            self.assertTrue(bucket.slow_down())
+        self.assertEqual(bucket.rate, 2.5)
+
+    def test_slow_down_stops_at_the_minimum_rate(self):
+        bucket = TokenBucket(rate=3, min_rate=2)
+        bucket.slow_down()
+        self.assertEqual(bucket.rate, 2)
+        self.assertFalse(bucket.slow_down())
+
+    def test_speed_up_recovers_to_the_initial_rate(self):
+        bucket = TokenBucket(rate=10)
+        bucket.slow_down()
+        for request in range(20):
+            bucket.speed_up()
+        self.assertEqual(bucket.rate, 10)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(base_delay=1, max_delay=10, budget=2)
+
+    def test_budget_is_shared_across_retries(self):
+        self.assertEqual([self.policy.spend() for retry in range(3)], [True, True, False])
+
+    def test_budget_refills_over_the_refill_interval(self):
+        policy = RetryPolicy(budget=2, refill_interval=10)
+        with patch('time.monotonic', return_value=policy.updated):
+            self.assertEqual([policy.spend() for retry in range(3)], [True, True, False])
+        with patch('time.monotonic', return_value=policy.updated + 5):
+            self.assertEqual([policy.spend() for retry in range(2)], [True, False])
+        with patch('time.monotonic', return_value=policy.updated + 100):
+            self.assertEqual([policy.spend() for retry in range(3)], [True, True, False])
+
+    @patch('random.uniform', side_effect=lambda low, high: high)
+    def test_backoff_grows_exponentially_up_to_the_maximum(self, mocked_random):
+        self.assertEqual([self.policy.delay(attempt) for attempt in range(5)], [1, 2, 4, 8, 10])
+
+    def test_retry_after_is_honoured(self):
+        self.assertEqual(self.policy.delay(0, retry_after=7.0), 7.0)
+
+    def test_retry_after_is_capped_at_the_maximum_delay(self):
+        self.assertEqual(self.policy.delay(0, retry_after=3600.0), 10)
+
+    def test_retry_after_in_seconds_and_dates(self):
+        self.assertEqual(RetryPolicy.parse_retry_after('3'), 3.0)
+        self.assertEqual(RetryPolicy.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(RetryPolicy.parse_retry_after('soon'))
+        self.assertIsNone(RetryPolicy.parse_retry_after(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
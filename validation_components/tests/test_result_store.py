@@ -0,0 +1,66 @@
+import unittest
+import os
+import json
+import tempfile
+
+from unittest.mock import patch
+from validation_components.manifest_querying import ManifestEntry
+from validation_components.result_store import ResultStore
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'results.json')
+        self.entry = ManifestEntry('sample1', 'Danio rerio', '7955')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def save(self, errors, resolver='ncbi', reusable=True):
+        results = ResultStore(self.path, resolver)
+        results.record(self.entry, errors, reusable)
+        results.save()
+
+    def test_missing_file_has_no_verdicts(self):
+        self.assertIsNone(ResultStore(self.path).lookup(self.entry))
+
+    def test_saved_verdicts_are_reused_for_unchanged_rows(self):
+        self.save(['sample1: error'])
+        results = ResultStore(self.path, 'ncbi')
+        self.assertEqual(results.lookup(self.entry), ['sample1: error'])
+        self.assertIsNone(results.lookup(ManifestEntry('sample1', 'Danio rerio', '7956')))
+
+    def test_verdicts_of_another_resolver_are_ignored(self):
+        self.save([])
+        self.assertIsNone(ResultStore(self.path, 'taxdump').lookup(self.entry))
+
+    def test_expired_verdicts_are_ignored(self):
+        self.save([])
+        with patch('time.time', return_value=os.path.getmtime(self.path) + 31 * 86400):
+            self.assertIsNone(ResultStore(self.path, 'ncbi').lookup(self.entry))
+
+    def test_unreusable_verdicts_are_not_saved(self):
+        self.save(['sample1: unresolved'], reusable=False)
+        with open(self.path) as results_file:
+            self.assertEqual(json.load(results_file)['rows'], {})
+
+    def test_verdicts_of_rows_not_checked_again_are_kept(self):
+        self.save(['sample1: error'])
+        results = ResultStore(self.path, 'ncbi')
+        other_entry = ManifestEntry('sample2', 'Homo sapiens', '9606')
+        results.record(other_entry, [])
+        results.save()
+        results = ResultStore(self.path, 'ncbi')
+        self.assertEqual(results.lookup(self.entry), ['sample1: error'])
+        self.assertEqual(results.lookup(other_entry), [])
+
+    def test_unreadable_file_has_no_verdicts(self):
+        with open(self.path, 'w') as results_file:
+            results_file.write('not json')
+        self.assertIsNone(ResultStore(self.path).lookup(self.entry))
+
+
+if __name__ == '__main__':
+    unittest.main()
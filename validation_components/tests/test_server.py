@@ -0,0 +1,131 @@
+import unittest
+import argparse
+import json
+import threading
+import http.client
+import urllib.request
+import urllib.error
+
+from unittest.mock import MagicMock, patch
+from validation_components.server import ValidationServer, serve
+
+
+class TestValidationServer(unittest.TestCase):
+
+    def setUp(self):
+        self.connecter = MagicMock()
+        self.connecter.query_ncbi_for_common_names.return_value = {'7955': ('Danio rerio', 'species'),
+                                                                   '9606': ('Homo sapiens', 'species')}
+        self.connecter.query_ncbi_for_taxon_ids.return_value = {'Danio reri': '__null__'}
+        self.server = ValidationServer(('127.0.0.1', 0), self.connecter)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path, body):
+        request = urllib.request.Request(self.url + path, data=body, method='POST')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, json.loads(error.read())
+
+    def test_health_check(self):
+        with urllib.request.urlopen(self.url + '/health') as response:
+            self.assertEqual(json.loads(response.read()), {'status': 'ok'})
+
+    def test_valid_manifest(self):
+        manifest = b'SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\nplate1,sample1,7955,Danio rerio\n'
+        status, results = self.post('/validate?filename=manifest.csv', manifest)
+        self.assertEqual(status, 200)
+        self.assertEqual(results, {'manifest': 'manifest.csv', 'valid': True, 'errors': []})
+
+    def test_invalid_manifest_returns_errors(self):
+        manifest = b'SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\nplate1,sample1,7955,Danio reri\n'
+        status, results = self.post('/validate?filename=manifest.csv', manifest)
+        self.assertEqual(status, 200)
+        self.assertFalse(results['valid'])
+        self.assertEqual(len(results['errors']), 1)
+        self.assertTrue(results['errors'][0].startswith('sample1: '))
+
+    def test_concurrent_uploads_share_one_resolver(self):
+        manifest = b'SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\nplate1,sample1,9606,Homo sapiens\n'
+        uploads = [threading.Thread(target=self.post, args=('/validate?filename=manifest.csv', manifest))
+                   for upload in range(4)]
+        for upload in uploads:
+            upload.start()
+        for upload in uploads:
+            upload.join()
+        self.assertEqual(self.connecter.query_ncbi_for_common_names.call_count, 4)
+        self.assertIs(self.server.connecter, self.connecter)
+
+    def test_metrics_are_exposed_for_prometheus(self):
+        manifest = b'SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\nplate1,sample1,7955,Danio rerio\n'
+        self.post('/validate?filename=manifest.csv', manifest)
+        with urllib.request.urlopen(self.url + '/metrics') as response:
+            lines = response.read().decode('utf-8').splitlines()
+        self.assertIn('manifest_validator_validations_total{outcome="valid"} 1', lines)
+        self.assertIn('manifest_validator_manifest_rows_total 1', lines)
+
+    def test_unreadable_manifest_is_rejected(self):
+        status, results = self.post('/validate?filename=manifest.pdf', b'%PDF-1.4')
+        self.assertEqual(status, 400)
+        self.assertIn('not in a recognised format', results['error'])
+
+    def test_corrupt_workbooks_are_rejected(self):
+        for file_name in ['manifest.xlsx', 'manifest.xls']:
+            status, results = self.post(f'/validate?filename={file_name}', b'abc')
+            self.assertEqual(status, 400)
+            self.assertTrue(results['error'].startswith(f'Manifest {file_name} could not be read'))
+        with urllib.request.urlopen(self.url + '/metrics') as response:
+            lines = response.read().decode('utf-8').splitlines()
+        self.assertIn('manifest_validator_validations_total{outcome="unreadable"} 2', lines)
+
+    @patch('validation_components.server.ValidationRequestHandler.log_error')
+    def test_unexpected_failures_are_reported_as_server_errors(self, mocked_log):
+        self.connecter.query_ncbi_for_common_names.side_effect = RuntimeError('resolver broke')
+        manifest = b'SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\nplate1,sample1,7955,Danio rerio\n'
+        status, results = self.post('/validate?filename=manifest.csv', manifest)
+        self.assertEqual(status, 500)
+        self.assertEqual(results, {'error': 'Validation failed: resolver broke'})
+
+    def test_empty_upload_is_rejected(self):
+        status, results = self.post('/validate', b'')
+        self.assertEqual(status, 400)
+
+    def test_file_names_naming_directories_are_replaced(self):
+        for file_name in ['..', '.', '']:
+            status, results = self.post(f'/validate?filename={file_name}', b'abc')
+            self.assertEqual(status, 400)
+            self.assertEqual(results, {'error': 'Manifest manifest is not in a recognised format'})
+
+    def test_bad_content_length_is_rejected(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1])
+        connection.putrequest('POST', '/validate?filename=manifest.csv')
+        connection.putheader('Content-Length', 'lots')
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(response.status, 400)
+        self.assertIn('Content-Length', json.loads(response.read())['error'])
+        connection.close()
+
+
+class TestServe(unittest.TestCase):
+
+    @patch('builtins.print')
+    @patch('validation_components.server.ValidationServer')
+    @patch('validation_components.server.build_connecter')
+    def test_retry_budget_of_the_daemon_refills(self, mocked_connecter, mocked_server, mocked_print):
+        mocked_server.return_value.__enter__.return_value.server_address = ('127.0.0.1', 8080)
+        mocked_server.return_value.__enter__.return_value.serve_forever.side_effect = KeyboardInterrupt
+        arguments = argparse.Namespace(host='127.0.0.1', port=8080, no_cache=False, taxdump=None)
+        serve(arguments)
+        self.assertEqual(mocked_connecter.call_args[0][0].retry_refill_interval, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import tempfile
+
+from validation_components import manifest_querying as m_query
+from validation_components.taxdump import compile_taxdump, TaxdumpQuery
+
+NODES = ['1\t|\t1\t|\tno rank\t|',
+         '7954\t|\t1\t|\tgenus\t|',
+         '7955\t|\t7954\t|\tspecies\t|',
+         '9606\t|\t1\t|\tspecies\t|',
+         '10000\t|\t1\t|\tspecies\t|']
+NAMES = ['1\t|\troot\t|\t\t|\tscientific name\t|',
+         '7954\t|\tDanio\t|\t\t|\tscientific name\t|',
+         '7955\t|\tDanio rerio\t|\t\t|\tscientific name\t|',
+         '7955\t|\tzebrafish\t|\t\t|\tgenbank common name\t|',
+         '9606\t|\tHomo sapiens\t|\t\t|\tscientific name\t|',
+         '9606\t|\thuman\t|\t\t|\tgenbank common name\t|',
+         '10000\t|\tHomonym\t|\t\t|\tscientific name\t|',
+         '7954\t|\tHomonym\t|\t\t|\tsynonym\t|']
+
+
+class TestTaxdumpQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        dump_directory = os.path.join(self.directory.name, 'dump')
+        os.makedirs(dump_directory)
+        for file_name, lines in [('nodes.dmp', NODES), ('names.dmp', NAMES)]:
+            with open(os.path.join(dump_directory, file_name), 'w') as dmp_file:
+                dmp_file.write('\n'.join(lines) + '\n')
+        self.index_directory = os.path.join(self.directory.name, 'index')
+        compile_taxdump(dump_directory, self.index_directory)
+        self.query = TaxdumpQuery(self.index_directory)
+
+    def tearDown(self):
+        self.query.close()
+        self.directory.cleanup()
+
+    def test_taxon_id_resolves_to_scientific_name_and_rank(self):
+        fake_manifest = m_query.ManifestEntry('sample1', 'zebrafish', '7955')
+        self.assertEqual(self.query.query_ncbi_for_common_name(fake_manifest), ('Danio rerio', 'species'))
+
+    def test_unknown_taxon_id_returns_null(self):
+        self.assertEqual(self.query.query_ncbi_for_common_names(['123', 'tax_id1', '7955\u00b2']),
+                         {'123': ('__null__', None), 'tax_id1': ('__null__', None), '7955\u00b2': ('__null__', None)})
+
+    def test_any_name_class_resolves_case_insensitively(self):
+        fake_manifest = m_query.ManifestEntry('sample1', 'Human', '__null__')
+        self.assertEqual(self.query.query_ncbi_for_taxon_id(fake_manifest), '9606')
+
+    def test_ambiguous_and_unknown_names_return_null(self):
+        for name in ['Homonym', 'Danio reri']:
+            fake_manifest = m_query.ManifestEntry('sample1', name, '__null__')
+            self.assertEqual(self.query.query_ncbi_for_taxon_id(fake_manifest), '__null__')
+
+    def test_misspelt_names_get_suggestions(self):
+        self.assertEqual(self.query.suggest_names('Danio reri'), [('Danio rerio', '7955')])
+        self.assertEqual(self.query.suggest_names('Homo sapien')[0], ('Homo sapiens', '9606'))
+
+    def test_incompatible_index_is_rejected(self):
+        with open(os.path.join(self.index_directory, 'meta.json'), 'w') as meta_file:
+            meta_file.write('{"version": 0, "byteorder": "little", "ranks": []}')
+        with self.assertRaises(ValueError):
+            TaxdumpQuery(self.index_directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
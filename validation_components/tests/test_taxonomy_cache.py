@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+
+from unittest.mock import patch
+from validation_components.taxonomy_cache import TaxonomyCache
+
+
+class TestTaxonomyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.directory.name, 'cache', 'taxonomy.sqlite')
+        self.cache = TaxonomyCache(self.cache_path)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_results_persist_across_instances(self):
+        self.cache.put_common_name('7955', 'Danio rerio', 'species')
+        self.cache.put_taxon_id('Danio rerio', '7955')
+        self.cache.close()
+        self.cache = TaxonomyCache(self.cache_path)
+        self.assertEqual(self.cache.get_common_name('7955'), ('Danio rerio', 'species'))
+        self.assertEqual(self.cache.get_taxon_id('Danio rerio'), '7955')
+
+    def test_missing_values_return_none(self):
+        self.assertIsNone(self.cache.get_common_name('7955'))
+        self.assertIsNone(self.cache.get_taxon_id('Danio rerio'))
+
+    def test_null_results_are_cached(self):
+        self.cache.put_common_name('123456789', '__null__', None)
+        self.assertEqual(self.cache.get_common_name('123456789'), ('__null__', None))
+
+    def test_scientific_names_skip_taxa_that_do_not_exist(self):
+        self.cache.put_common_names({'7955': ('Danio rerio', 'species'), '123456789': ('__null__', None)})
+        self.assertEqual(self.cache.scientific_names(), [('Danio rerio', '7955')])
+
+    def test_expired_entries_are_ignored(self):
+        self.cache.put_common_names({'7955': ('Danio rerio', 'species')})
+        with patch('time.time', return_value=self.cache.expiry_cutoff() + self.cache.ttl * 2):
+            self.assertIsNone(self.cache.get_common_name('7955'))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_entries = 2
+        with patch('time.time', return_value=1000):
+            self.cache.put_taxon_id('first', '1')
+        with patch('time.time', return_value=2000):
+            self.cache.put_taxon_id('second', '2')
+        with patch('time.time', return_value=3000):
+            self.cache.get_taxon_id('first')
+            self.cache.put_taxon_id('third', '3')
+        with patch('time.time', return_value=4000):
+            self.assertEqual(self.cache.get_taxon_ids(['first', 'second', 'third']), {'first': '1', 'third': '3'})
+
+    def test_refresh_skips_reads_but_stores_results(self):
+        self.cache.put_taxon_id('Danio rerio', '7955')
+        refreshing_cache = TaxonomyCache(self.cache_path, refresh=True)
+        self.assertIsNone(refreshing_cache.get_taxon_id('Danio rerio'))
+        refreshing_cache.put_taxon_id('Danio rerio', '7956')
+        refreshing_cache.close()
+        self.assertEqual(self.cache.get_taxon_id('Danio rerio'), '7956')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,20 @@
 import unittest
 import os
+import re
+import json
+from urllib.parse import urlsplit, parse_qs
+import types
+import shutil
+import tempfile
+import zipfile
+import openpyxl
 
 from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
 from validation_components import manifest_querying as m_query, validation as vl
-from _datetime import datetime
+from validation_components.metrics import Metrics
+from validation_components.result_store import ResultStore
+from validation_components.taxonomy_cache import TaxonomyCache
 
 
 class TestNcbiQuerying(unittest.TestCase):
@@ -13,19 +24,115 @@ class TestNcbiQuerying(unittest.TestCase):
         common_name = 'Danio rerio'
         taxon_id = '7955'
         self.fake_manifest = m_query.ManifestEntry(sample_id, common_name, taxon_id)
-        self.ncbi_queries = m_query.NcbiQuery()
+        self.ncbi_queries = m_query.NcbiQuery(requests_per_second=1000)
 
-    class MockedNcbiQuery:
-        def __init__(self):
-            self.timestamp = None
+    @staticmethod
+    def answered_response(search_json=None):
+        response = MagicMock()
+        response.json.return_value = {'result': {}} if search_json is None else search_json
+        return response
 
     @patch('requests.Session')
     def test_ncbi_search(self, mocked_session):
+        mocked_session.return_value.get.return_value = self.answered_response()
         url = 'https://fake.url.gov/page/id'
         self.ncbi_queries.ncbi_search(url)
-        self.assertIn(unittest.mock.call().get('https://fake.url.gov/page/id'),
+        self.assertIn(unittest.mock.call().get('https://fake.url.gov/page/id', timeout=self.ncbi_queries.timeout),
                       mocked_session.mock_calls)
 
+    @patch('requests.Session')
+    def test_ncbi_search_reuses_one_session(self, mocked_session):
+        mocked_session.return_value.get.return_value = self.answered_response()
+        self.ncbi_queries.ncbi_search('https://fake.url.gov/page/1')
+        self.ncbi_queries.ncbi_search('https://fake.url.gov/page/2')
+        mocked_session.assert_called_once()
+        self.assertEqual(mocked_session.return_value.get.call_count, 2)
+
+    @patch('requests.Session')
+    def test_context_manager_closes_session(self, mocked_session):
+        mocked_session.return_value.get.return_value = self.answered_response()
+        with m_query.NcbiQuery() as ncbi_queries:
+            ncbi_queries.ncbi_search('https://fake.url.gov/page/id')
+        mocked_session.return_value.close.assert_called_once()
+        self.assertIsNone(ncbi_queries._session)
+
+    @staticmethod
+    def failed_response(status_code, retry_after=None):
+        response = MagicMock()
+        response.__bool__.return_value = False
+        response.status_code = status_code
+        response.headers = {} if retry_after is None else {'Retry-After': retry_after}
+        return response
+
+    @patch('time.sleep')
+    @patch('requests.Session')
+    def test_ncbi_search_retries_rate_limited_requests(self, mocked_session, mocked_sleep):
+        mocked_session.return_value.get.side_effect = [self.failed_response(429, '2'), self.failed_response(503),
+                                                       self.answered_response()]
+        self.ncbi_queries.ncbi_search('https://fake.url.gov/page/id')
+        self.assertEqual(mocked_session.return_value.get.call_count, 3)
+        self.assertEqual(mocked_sleep.call_args_list[0][0][0], 2.0)
+
+    @patch('time.sleep')
+    @patch('requests.Session')
+    def test_ncbi_search_does_not_retry_client_errors(self, mocked_session, mocked_sleep):
+        mocked_session.return_value.get.return_value = self.failed_response(400)
+        with self.assertRaises(m_query.NcbiUnavailableError):
+            self.ncbi_queries.ncbi_search('https://fake.url.gov/page/id')
+        mocked_session.return_value.get.assert_called_once()
+
+    @patch('time.sleep')
+    @patch('requests.Session')
+    def test_ncbi_search_stops_when_retry_budget_is_spent(self, mocked_session, mocked_sleep):
+        self.ncbi_queries.retry_policy.remaining = 1
+        mocked_session.return_value.get.return_value = self.failed_response(500)
+        with self.assertRaises(m_query.NcbiUnavailableError):
+            self.ncbi_queries.ncbi_search('https://fake.url.gov/page/1')
+        with self.assertRaises(m_query.NcbiUnavailableError):
+            self.ncbi_queries.ncbi_search('https://fake.url.gov/page/2')
+        self.assertEqual(mocked_session.return_value.get.call_count, 3)
+
+    @patch('time.sleep')
+    @patch('requests.Session')
+    def test_ncbi_search_records_request_metrics(self, mocked_session, mocked_sleep):
+        metrics = Metrics()
+        ncbi_queries = m_query.NcbiQuery(requests_per_second=1000, metrics=metrics)
+        mocked_session.return_value.get.side_effect = [self.failed_response(429, '2'), self.answered_response()]
+        ncbi_queries.ncbi_search(ncbi_queries.build_search_url('Danio rerio'))
+        self.assertEqual(metrics.counters[('ncbi_requests', (('endpoint', 'esearch'),))], 2)
+        self.assertEqual(metrics.counters[('ncbi_responses', (('status', '429'),))], 1)
+        self.assertEqual(metrics.timings[('retry_wait_seconds', ())], 2.0)
+        self.assertEqual(metrics.histograms[('ncbi_request_seconds', (('endpoint', 'esearch'),))].count, 2)
+
+    @patch('time.sleep')
+    @patch('requests.Session')
+    def test_ncbi_search_retries_responses_that_are_not_json(self, mocked_session, mocked_sleep):
+        metrics = Metrics()
+        ncbi_queries = m_query.NcbiQuery(requests_per_second=1000, metrics=metrics)
+        mocked_session.return_value.get.return_value.json.side_effect = ValueError('Expecting value')
+        with self.assertRaises(m_query.NcbiUnavailableError):
+            ncbi_queries.ncbi_search(ncbi_queries.build_search_url('Danio rerio'))
+        self.assertEqual(mocked_session.return_value.get.call_count, ncbi_queries.retry_policy.max_attempts)
+        self.assertEqual(metrics.counters[('ncbi_invalid_responses', (('endpoint', 'esearch'),))],
+                         ncbi_queries.retry_policy.max_attempts)
+        self.assertEqual(ncbi_queries.query_ncbi_for_common_names(['7955']), {'7955': ('__unresolved__', None)})
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_common_names_marks_failed_batches_unresolved(self, mocked_search):
+        self.ncbi_queries.esummary_batch_size = 1
+        self.ncbi_queries.cache = MagicMock()
+        self.ncbi_queries.cache.get_common_names.return_value = {}
+
+        def search(url):
+            if 'id=7955&' not in url:
+                raise m_query.NcbiUnavailableError()
+            return {'result': {'7955': {'scientificname': 'Danio rerio', 'rank': 'species'}}}
+
+        mocked_search.side_effect = search
+        returned_lookup = self.ncbi_queries.query_ncbi_for_common_names(['7955', '9606'])
+        self.assertEqual(returned_lookup, {'7955': ('Danio rerio', 'species'), '9606': ('__unresolved__', None)})
+        self.ncbi_queries.cache.put_common_names.assert_called_once_with({'7955': ('Danio rerio', 'species')})
+
     def test_build_url_with_common_name(self):
         esearch = True
         expected_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=taxonomy&field=All%20Names&term' \
@@ -72,31 +179,178 @@ class TestNcbiQuerying(unittest.TestCase):
         returned_common_name = self.ncbi_queries.query_ncbi_for_common_name(self.fake_manifest)
         self.assertEqual(returned_common_name, expected_common_name_data)
 
-    @patch('time.sleep')
-    @patch('validation_components.manifest_querying.NcbiQuery.get_now',
-           return_value=datetime(2019, 12, 20, 14, 0, 59, 360000))
-    def test_get_time_enough_time_passed(self, mock_datetime, mock_waiting):
-        previous_timestamp = self.MockedNcbiQuery()
-        previous_timestamp.timestamp = datetime(2019, 12, 20, 14, 0, 59, 0)
-        m_query.NcbiQuery.generate_new_timestamp(previous_timestamp)
-        mock_waiting.assert_not_called()
+    def test_api_key_raises_the_rate_and_is_sent_with_requests(self):
+        ncbi_queries = m_query.NcbiQuery(api_key='secret', tool='manifest-validator', email='me@example.org')
+        self.assertEqual(ncbi_queries.limiter.rate, 10)
+        self.assertEqual(m_query.NcbiQuery().limiter.rate, 3)
+        self.assertTrue(ncbi_queries.build_batch_url(['7955']).endswith(
+            '&retmode=json&api_key=secret&tool=manifest-validator&email=me%40example.org'))
 
     @patch('time.sleep')
-    @patch('validation_components.manifest_querying.NcbiQuery.get_now',
-           return_value=datetime(2019, 12, 20, 14, 0, 59, 360000))
-    def test_get_time_not_enough_time_passed(self, mock_datetime, mock_waiting):
-        previous_timestamp = self.MockedNcbiQuery()
-        previous_timestamp.timestamp = datetime(2019, 12, 20, 14, 0, 59, 360000)
-        m_query.NcbiQuery.generate_new_timestamp(previous_timestamp)
-        mock_waiting.assert_called_once()
+    @patch('requests.Session')
+    def test_rate_limited_requests_slow_the_limiter_down(self, mocked_session, mocked_sleep):
+        ncbi_queries = m_query.NcbiQuery(api_key='secret')
+        mocked_session.return_value.get.side_effect = [self.failed_response(429), self.answered_response()]
+        ncbi_queries.ncbi_search('https://fake.url.gov/page/id')
+        self.assertLess(ncbi_queries.limiter.rate, 10)
+
+    def test_build_batch_url_with_taxon_ids(self):
+        expected_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi?db=taxonomy&id=7955,9606&retmode=json'
+        returned_url = self.ncbi_queries.build_batch_url(['7955', '9606'])
+        self.assertEqual(returned_url, expected_url)
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_common_names_batches_ids(self, mocked_search):
+        self.ncbi_queries.esummary_batch_size = 2
+        mocked_search.return_value = {'result': {'7955': {'scientificname': 'Danio rerio', 'rank': 'species'},
+                                                 '9606': {'scientificname': 'Homo sapiens', 'rank': 'species'},
+                                                 '10090': {'error': 'cannot get document summary'}}}
+        returned_lookup = self.ncbi_queries.query_ncbi_for_common_names(['7955', '9606', '7955', '10090'])
+        self.assertEqual(mocked_search.call_count, 2)
+        self.assertEqual(returned_lookup, {'7955': ('Danio rerio', 'species'),
+                                           '9606': ('Homo sapiens', 'species'),
+                                           '10090': ('__null__', None)})
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_ids_left_out_of_a_reply_are_unresolved_and_not_cached(self, mocked_search):
+        self.ncbi_queries.cache = MagicMock()
+        self.ncbi_queries.cache.get_common_names.return_value = {}
+        mocked_search.return_value = {'result': {'7955': {'scientificname': 'Danio rerio', 'rank': 'species'}}}
+        returned_lookup = self.ncbi_queries.query_ncbi_for_common_names(['7955', '9606'])
+        self.assertEqual(returned_lookup, {'7955': ('Danio rerio', 'species'), '9606': ('__unresolved__', None)})
+        self.ncbi_queries.cache.put_common_names.assert_called_once_with({'7955': ('Danio rerio', 'species')})
 
     @patch('time.sleep')
-    @patch('validation_components.manifest_querying.NcbiQuery.get_now',
-           return_value=datetime(2019, 12, 20, 14, 0, 59, 360000))
-    def test_get_time_not_yet_established(self, mock_datetime, mock_waiting):
-        previous_timestamp = self.MockedNcbiQuery()
-        m_query.NcbiQuery.generate_new_timestamp(previous_timestamp)
-        mock_waiting.assert_not_called()
+    @patch('requests.Session')
+    def test_error_replies_are_retried_and_never_cached(self, mocked_session, mocked_sleep):
+        cache = TaxonomyCache(':memory:')
+        ncbi_queries = m_query.NcbiQuery(cache=cache, requests_per_second=1000)
+        error_replies = [{'error': 'API rate limit exceeded'}, {'esearchresult': {'ERROR': 'Invalid query syntax'}},
+                         {'header': {'type': 'esummary'}}]
+        mocked_session.return_value.get.side_effect = \
+            lambda url, timeout: self.answered_response(error_replies[mocked_session.return_value.get.call_count % 3])
+        self.assertEqual(ncbi_queries.query_ncbi_for_common_names(['7955', '9606']),
+                         {'7955': ('__unresolved__', None), '9606': ('__unresolved__', None)})
+        self.assertEqual(ncbi_queries.query_ncbi_for_taxon_ids(['Danio rerio']), {'Danio rerio': '__unresolved__'})
+        with self.assertRaises(m_query.NcbiUnavailableError):
+            ncbi_queries.query_ncbi_for_taxon_id(self.fake_manifest)
+        self.assertEqual(cache.get_common_names(['7955', '9606']), {})
+        self.assertEqual(cache.get_taxon_ids(['Danio rerio']), {})
+        self.assertIsNone(cache.get_taxon_id('Danio rerio'))
+
+    def test_replies_are_answered_only_when_they_hold_results(self):
+        self.assertTrue(m_query.NcbiQuery.answered({'result': {'uids': []}}))
+        self.assertTrue(m_query.NcbiQuery.answered({'esearchresult': {'count': '0', 'idlist': []}}))
+        for reply in [None, [], {'error': 'API rate limit exceeded'}, {'esearchresult': {'ERROR': 'Invalid query'}},
+                      {'esearchresult': {'count': '0'}}, {'result': 'none'}]:
+            self.assertFalse(m_query.NcbiQuery.answered(reply))
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_common_names_skips_non_numeric_ids(self, mocked_search):
+        returned_lookup = self.ncbi_queries.query_ncbi_for_common_names(['tax_id1', '7955\u00b2'])
+        mocked_search.assert_not_called()
+        self.assertEqual(returned_lookup, {'tax_id1': ('__null__', None), '7955\u00b2': ('__null__', None)})
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_taxon_id_reads_cache_first(self, mocked_search):
+        self.ncbi_queries.cache = MagicMock()
+        self.ncbi_queries.cache.get_taxon_id.return_value = '7955'
+        returned_taxon_id = self.ncbi_queries.query_ncbi_for_taxon_id(self.fake_manifest)
+        self.assertEqual(returned_taxon_id, '7955')
+        mocked_search.assert_not_called()
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_common_name_stores_result_in_cache(self, mocked_search):
+        self.ncbi_queries.cache = MagicMock()
+        self.ncbi_queries.cache.get_common_name.return_value = None
+        mocked_search.return_value = {'result': {'7955': {'scientificname': 'Danio rerio', 'rank': 'species'}}}
+        returned_common_name = self.ncbi_queries.query_ncbi_for_common_name(self.fake_manifest)
+        self.assertEqual(returned_common_name, ('Danio rerio', 'species'))
+        self.ncbi_queries.cache.put_common_name.assert_called_with('7955', 'Danio rerio', 'species')
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_common_names_only_queries_uncached_ids(self, mocked_search):
+        self.ncbi_queries.cache = MagicMock()
+        self.ncbi_queries.cache.get_common_names.return_value = {'7955': ('Danio rerio', 'species')}
+        mocked_search.return_value = {'result': {'9606': {'scientificname': 'Homo sapiens', 'rank': 'species'}}}
+        returned_lookup = self.ncbi_queries.query_ncbi_for_common_names(['7955', '9606'])
+        self.assertEqual(returned_lookup, {'7955': ('Danio rerio', 'species'), '9606': ('Homo sapiens', 'species')})
+        mocked_search.assert_called_once()
+        self.assertIn('id=9606&', mocked_search.call_args[0][0])
+
+    @staticmethod
+    def fake_name_search(taxa, synonyms=None):
+        '''Answers esearch and esummary urls from taxon ID -> (scientific name, common name) as NCBI would'''
+        names = {}
+        for taxon_id, taxon_names in taxa.items():
+            for name in taxon_names:
+                names.setdefault(name.lower(), []).append(taxon_id)
+        for synonym, taxon_id in (synonyms or {}).items():
+            names.setdefault(synonym.lower(), []).append(taxon_id)
+
+        def search(url):
+            query = parse_qs(urlsplit(url).query)
+            if 'id' in query:
+                return {'result': {taxon_id: {'scientificname': taxa[taxon_id][0], 'commonname': taxa[taxon_id][1]}
+                                   for taxon_id in query['id'][0].split(',')}}
+            phrases = re.findall(r'"([^"]*)"\[All Names\]', query['term'][0])
+            if not phrases:
+                return {'esearchresult': {'idlist': names.get(query['term'][0].lower(), [])}}
+            taxon_ids = sorted({taxon_id for phrase in phrases for taxon_id in names.get(phrase.lower(), [])})
+            return {'esearchresult': {
+                'idlist': taxon_ids[:int(query['retmax'][0])],
+                'translationstack': [{'term': f'"{phrase}"[All Names]', 'count': str(len(names[phrase.lower()]))}
+                                     for phrase in phrases if phrase.lower() in names] + ['OR', 'GROUP'],
+                'errorlist': {'phrasesnotfound': [phrase for phrase in phrases if phrase.lower() not in names]}}}
+        return search
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_taxon_ids_resolves_names_in_batches(self, mocked_search):
+        mocked_search.side_effect = self.fake_name_search({'7955': ('Danio rerio', 'zebrafish'),
+                                                           '7954': ('Danio', ''), '1': ('Danio', '')})
+        returned_lookup = self.ncbi_queries.query_ncbi_for_taxon_ids(['Danio rerio', 'Danio reri', 'Danio rerio',
+                                                                      'Danio'])
+        self.assertEqual(returned_lookup, {'Danio rerio': '7955', 'Danio reri': '__null__', 'Danio': '__null__'})
+        self.assertEqual(mocked_search.call_count, 2)
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_taxon_ids_maps_batched_ids_back_to_names(self, mocked_search):
+        mocked_search.side_effect = self.fake_name_search({'7955': ('Danio rerio', 'zebrafish'),
+                                                           '9606': ('Homo sapiens', 'human'),
+                                                           '10090': ('Mus musculus', 'house mouse')},
+                                                          synonyms={'mouse': '10090'})
+        returned_lookup = self.ncbi_queries.query_ncbi_for_taxon_ids(['Danio rerio', 'human', 'Homo sapiens', 'mouse'])
+        self.assertEqual(returned_lookup, {'Danio rerio': '7955', 'human': '9606', 'Homo sapiens': '9606',
+                                           'mouse': '10090'})
+        # the synonym left over pairs with the only taxon ID left over
+        self.assertEqual(mocked_search.call_count, 3)
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_taxon_ids_searches_for_unmapped_names_alone(self, mocked_search):
+        mocked_search.side_effect = self.fake_name_search({'7955': ('Danio rerio', 'zebrafish')},
+                                                          synonyms={'Brachydanio rerio': '7955'})
+        returned_lookup = self.ncbi_queries.query_ncbi_for_taxon_ids(['Danio rerio', 'Brachydanio rerio'])
+        self.assertEqual(returned_lookup, {'Danio rerio': '7955', 'Brachydanio rerio': '7955'})
+        self.assertEqual(mocked_search.call_count, 4)
+        self.assertIn('term=Brachydanio rerio&', mocked_search.call_args_list[-1][0][0])
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_query_ncbi_for_taxon_ids_marks_failed_batches_unresolved(self, mocked_search):
+        mocked_search.side_effect = m_query.NcbiUnavailableError('Could not connect to NCBI database')
+        returned_lookup = self.ncbi_queries.query_ncbi_for_taxon_ids(['Danio rerio', 'Homo sapiens'])
+        self.assertEqual(returned_lookup, {'Danio rerio': '__unresolved__', 'Homo sapiens': '__unresolved__'})
+        mocked_search.assert_called_once()
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_ncbi_search_all_keeps_url_order(self, mocked_search):
+        mocked_search.side_effect = lambda url: url.upper()
+        returned_results = self.ncbi_queries.ncbi_search_all(['a', 'b', 'c'])
+        self.assertEqual(returned_results, ['A', 'B', 'C'])
+
+    @patch('validation_components.manifest_querying.NcbiQuery.ncbi_search')
+    def test_ncbi_search_all_without_urls_makes_no_requests(self, mocked_search):
+        self.assertEqual(self.ncbi_queries.ncbi_search_all([]), [])
+        mocked_search.assert_not_called()
 
 
 class TestManifestEntry(unittest.TestCase):
@@ -185,14 +439,14 @@ class TestValidationRunner(unittest.TestCase):
         self.ncbi_common_name = 'Real Common Name'
         self.ncbi_taxon_id = "12345"
         self.mocked_query = MagicMock()
-        self.mocked_query.generate_new_timestamp.return_value = 1
+        self.mocked_query.throttle.return_value = None
 
     @patch('builtins.print')
-    @patch('validation_components.validation.verify_entries')
+    @patch('validation_components.validation.iter_errors')
     @patch('validation_components.manifest_querying.SpreadsheetLoader.__init__')
     @patch('validation_components.manifest_querying.SpreadsheetLoader.load')
     def test_successful_validation(self, mocked_load, patched_spreadsheet, mocked_inner, mocked_print):
-        argparse_with_spreadsheet = self.Namespace(spreadsheet='')
+        argparse_with_spreadsheet = self.Namespace(spreadsheet='', no_cache=True)
         EMPTY_LIST = []
         EXPECTED = 'Manifest successfully validated, no errors found!'
         mocked_inner.return_value = EMPTY_LIST
@@ -202,18 +456,188 @@ class TestValidationRunner(unittest.TestCase):
         mocked_print.assert_called_with(EXPECTED)
 
     @patch('builtins.print')
-    @patch('validation_components.validation.verify_entries')
+    @patch('validation_components.validation.iter_errors')
     @patch('validation_components.manifest_querying.SpreadsheetLoader.__init__')
     @patch('validation_components.manifest_querying.SpreadsheetLoader.load')
     def test_unsuccessful_validation(self, mocked_load, patched_spreadsheet, mocked_inner, mocked_print):
-        argparse_with_spreadsheet = self.Namespace(spreadsheet='')
+        argparse_with_spreadsheet = self.Namespace(spreadsheet='', no_cache=True)
         NON_EMPTY_LIST = ['err', 'err2']
         EXPECTED = 'Errors found within manifest:\n\terr\n\terr2\nPlease correct mistakes and validate again.'
         mocked_inner.return_value = NON_EMPTY_LIST
         patched_spreadsheet.return_value = None
         vl.validation_runner(argparse_with_spreadsheet)
         mocked_load.assert_called_once()
-        mocked_print.assert_called_with(EXPECTED)
+        printed = '\n'.join(call[0][0] for call in mocked_print.call_args_list)
+        self.assertEqual(printed, EXPECTED)
+
+    @patch('builtins.print')
+    def test_report_errors_prints_each_error_as_it_arrives(self, mocked_print):
+        def errors():
+            yield 'err'
+            self.assertEqual(mocked_print.call_count, 2)
+            yield 'err2'
+
+        returned_value = vl.report_errors(errors())
+        self.assertEqual(returned_value, 2)
+        self.assertEqual(mocked_print.call_count, 4)
+
+    @patch('builtins.print')
+    def test_report_records_writes_one_json_record_per_error(self, mocked_print):
+        error = m_query.EntryError('abc123: error', {'sample_id': 'abc123', 'row': 4, 'error': 'mismatch'})
+        returned_value = vl.report_records(iter([error]), 'manifest.csv')
+        self.assertEqual(returned_value, 1)
+        records = [json.loads(call[0][0]) for call in mocked_print.call_args_list]
+        self.assertEqual(records[0]['type'], 'error')
+        self.assertEqual(records[0]['row'], 4)
+        self.assertEqual(records[0]['message'], 'abc123: error')
+        self.assertIsNone(records[0]['expected_taxon_id'])
+        self.assertEqual(records[1], {'type': 'summary', 'manifest': 'manifest.csv', 'valid': False, 'errors': 1,
+                                      'complete': True, 'stopped_by': None})
+
+    def test_read_ahead_yields_every_entry(self):
+        self.assertEqual(list(vl.read_ahead(iter(range(50)), buffer_size=3)), list(range(50)))
+
+    def test_read_ahead_raises_loader_errors(self):
+        def entries():
+            yield 1
+            raise ValueError('bad sheet')
+
+        with self.assertRaises(ValueError):
+            list(vl.read_ahead(entries()))
+
+    def test_read_ahead_stops_reading_when_abandoned(self):
+        consumed = []
+
+        def entries():
+            for entry in range(1000):
+                consumed.append(entry)
+                yield entry
+
+        ahead = vl.read_ahead(entries(), buffer_size=2)
+        next(ahead)
+        ahead.close()
+        self.assertLess(len(consumed), 10)
+
+    def test_chunk_entries_counts_new_taxon_ids_and_names(self):
+        entries = [m_query.ManifestEntry(f's{number}', name, '1') for number, name in enumerate('aabacd')]
+        chunks = list(vl.chunk_entries(entries, 3))
+        self.assertEqual([[entry.common_name for entry in chunk] for chunk in chunks], [['a', 'a', 'b'], ['a', 'c', 'd']])
+
+    def test_iter_errors_resolves_each_value_once_however_it_is_paired(self):
+        self.mocked_query.query_ncbi_for_common_names.side_effect = \
+            lambda taxon_ids: {taxon_id: ('Danio rerio', 'species') for taxon_id in taxon_ids}
+        self.mocked_query.query_ncbi_for_taxon_ids.side_effect = lambda names: {name: '7955' for name in names}
+        entries = [m_query.ManifestEntry('s1', 'Danio rerio', '7955'),
+                   m_query.ManifestEntry('s2', 'Danio reri', '7955'),
+                   m_query.ManifestEntry('s3', 'Danio reri', '7956'),
+                   m_query.ManifestEntry('s4', 'Danio rerio', '7956')]
+        list(vl.iter_errors(entries, self.mocked_query, chunk_size=1))
+        requested_taxa = [taxon_id for call in self.mocked_query.query_ncbi_for_common_names.call_args_list
+                          for taxon_id in call[0][0]]
+        requested_names = [name for call in self.mocked_query.query_ncbi_for_taxon_ids.call_args_list
+                           for name in call[0][0]]
+        self.assertEqual(sorted(requested_taxa), ['7955', '7956'])
+        self.assertEqual(requested_names, ['Danio reri'])
+
+    @patch('validation_components.validation.prefetch_lookups',
+           return_value=({'57': ('E. coli O157', 'strain'), '7': ('E. coli O157', 'strain')},
+                         {'E. coli O1': '__null__', 'E. coli O15': '__null__'}))
+    def test_iter_errors_tells_apart_pairs_that_concatenate_alike(self, mocked_prefetch):
+        self.mocked_query.suggest_names.return_value = []
+        entries = [m_query.ManifestEntry('s1', 'E. coli O1', '57'),
+                   m_query.ManifestEntry('s2', 'E. coli O15', '7')]
+        errors = list(vl.iter_errors(entries, self.mocked_query))
+        self.assertIn("'E. coli O1' does not exist", errors[0])
+        self.assertIn("'E. coli O15' does not exist", errors[1])
+        self.assertIn('taxon ID 7 is', errors[1])
+
+    def test_chunk_entries_grows_from_first_chunk_size(self):
+        entries = [m_query.ManifestEntry(f's{number}', name, '1') for number, name in enumerate('abcdefgh')]
+        chunks = list(vl.chunk_entries(entries, 8, first_chunk_size=2))
+        self.assertEqual([''.join(entry.common_name for entry in chunk) for chunk in chunks], ['a', 'bcde', 'fgh'])
+
+    @patch('validation_components.validation.prefetch_lookups',
+           return_value=({'7955': ('Danio rerio', 'species')}, {'Homo sapiens': '9606'}))
+    def test_rows_repeating_a_pair_take_its_verdict(self, mocked_prefetch):
+        entries = [m_query.ManifestEntry(f's{number}', 'Homo sapiens', '7955', number) for number in range(3)]
+        with patch('validation_components.validation.check_pair', wraps=vl.check_pair) as mocked_check:
+            errors = list(vl.iter_errors(entries, self.mocked_query))
+        mocked_check.assert_called_once()
+        self.assertEqual([(error.record['sample_id'], error.record['row']) for error in errors],
+                         [('s0', 0), ('s1', 1), ('s2', 2)])
+        self.assertTrue(all(error.startswith(f's{number}: ') for number, error in enumerate(errors)))
+
+    def test_sample_entries_picks_one_row_per_distinct_taxon(self):
+        entries = [m_query.ManifestEntry(f's{number}', f'name{number % 5}', str(number % 5)) for number in range(50)]
+        sampled = vl.sample_entries(entries, 3, seed=1)
+        self.assertEqual(len({(entry.taxon_id, entry.common_name) for entry in sampled}), 3)
+        self.assertEqual(len(vl.sample_entries(entries, 10)), 5)
+
+    @patch('builtins.print')
+    def test_fail_fast_stops_looking_up_taxa_at_the_first_error(self, mocked_print):
+        self.mocked_query.query_ncbi_for_common_names.side_effect = \
+            lambda taxon_ids: {taxon_id: ('__null__', None) for taxon_id in taxon_ids}
+        self.mocked_query.query_ncbi_for_taxon_ids.side_effect = lambda names: {name: '__null__' for name in names}
+        self.mocked_query.suggest_names.return_value = []
+        entries = [m_query.ManifestEntry(f's{number}', f'name{number}', str(number)) for number in range(1000)]
+        error_count = vl.check_manifest(iter(entries), self.mocked_query, self.Namespace(fail_fast=True))
+        self.assertEqual(error_count, 1)
+        looked_up = sum(len(call[0][0]) for call in self.mocked_query.query_ncbi_for_common_names.call_args_list)
+        self.assertLessEqual(looked_up, vl.EARLY_CHUNK_SIZE)
+        printed = [call[0][0] for call in mocked_print.call_args_list]
+        self.assertIn('Reached the limit of 1 errors - the rest of the manifest was not checked.', printed)
+
+    @patch('builtins.print')
+    def test_sample_errors_reject_the_manifest_before_the_rest_is_checked(self, mocked_print):
+        self.mocked_query.query_ncbi_for_common_names.side_effect = \
+            lambda taxon_ids: {taxon_id: ('__null__', None) for taxon_id in taxon_ids}
+        self.mocked_query.query_ncbi_for_taxon_ids.side_effect = lambda names: {name: '__null__' for name in names}
+        self.mocked_query.suggest_names.return_value = []
+        entries = [m_query.ManifestEntry(f's{number}', 'name', '1') for number in range(10)]
+        error_count = vl.check_manifest(iter(entries), self.mocked_query,
+                                        self.Namespace(sample=5, output_format='ndjson'), 'manifest.csv')
+        self.assertEqual(error_count, 1)
+        summary = json.loads(mocked_print.call_args[0][0])
+        self.assertEqual((summary['complete'], summary['stopped_by']), (False, 'sample'))
+
+    @patch('builtins.print')
+    def test_clean_sample_goes_on_to_check_the_rest_without_looking_it_up_again(self, mocked_print):
+        self.mocked_query.query_ncbi_for_common_names.side_effect = \
+            lambda taxon_ids: {taxon_id: (f'name{taxon_id}', 'species') for taxon_id in taxon_ids}
+        entries = [m_query.ManifestEntry(f's{number}', f'name{number % 4}', str(number % 4)) for number in range(20)]
+        error_count = vl.check_manifest(iter(entries), self.mocked_query, self.Namespace(sample=2))
+        self.assertEqual(error_count, 0)
+        looked_up = [taxon_id for call in self.mocked_query.query_ncbi_for_common_names.call_args_list
+                     for taxon_id in call[0][0]]
+        self.assertEqual(sorted(looked_up), ['0', '1', '2', '3'])
+        mocked_print.assert_called_with('Manifest successfully validated, no errors found!')
+
+    @patch('validation_components.validation.prefetch_lookups', return_value=({}, {}))
+    def test_iter_errors_yields_before_reading_later_chunks(self, mocked_prefetch):
+        consumed = []
+
+        def entries():
+            for number in range(10):
+                consumed.append(number)
+                yield m_query.ManifestEntry(f's{number}', '__null__', '__null__')
+
+        errors = vl.iter_errors(entries(), self.mocked_query, chunk_size=1)
+        next(errors)
+        self.assertLess(len(consumed), 10)
+
+    @patch('validation_components.validation.prefetch_lookups',
+           return_value=({'1': ('__null__', None)}, {'name': '__null__'}))
+    def test_iter_errors_records_metrics_of_a_chunk_left_part_way(self, mocked_prefetch):
+        self.mocked_query.suggest_names.return_value = []
+        metrics = Metrics()
+        entries = [m_query.ManifestEntry(f's{number}', 'name', '1') for number in range(10)]
+        errors = vl.iter_errors(entries, self.mocked_query, metrics=metrics)
+        next(errors)
+        errors.close()
+        self.assertEqual(metrics.counters[('manifest_rows', ())], 1)
+        self.assertEqual(metrics.counters[('lookup_misses', ())], 2)
+        self.assertEqual(metrics.counters[('verdict_misses', ())], 1)
+        self.assertIn(('stage_seconds', (('stage', 'check'),)), metrics.timings)
 
     @patch('validation_components.manifest_querying.NcbiQuery.__init__')
     def test_verify_entries_present_in_dictionary(self, mocked_query):
@@ -221,23 +645,22 @@ class TestValidationRunner(unittest.TestCase):
         self.fake_manifest.sample_id = 'abc123'
         self.fake_manifest.common_name = '__null__'
         self.fake_manifest.taxon_id = '__null__'
-        self.fake_manifest.query_id = '__null____null__'
         ENTRY_LIST = [self.fake_manifest]
         returned_value = vl.verify_entries(ENTRY_LIST)
         expected_return = ["abc123: No taxon ID or common name specified. If unkown please use 32644 - 'unidentified'."]
         self.assertEqual(returned_value, expected_return)
 
+    @patch('validation_components.validation.prefetch_lookups', return_value=({}, {}))
     @patch('validation_components.validation.define_error')
     @patch('validation_components.validation.resolve_common_name')
     @patch('validation_components.validation.resolve_taxon_id')
     @patch('validation_components.manifest_querying.NcbiQuery.__init__')
-    def test_verify_entries_matching_gets_one_search(self, mocked_query, mocked_taxon_return, mocked_common_name_return, mocked_error):
+    def test_verify_entries_matching_gets_one_search(self, mocked_query, mocked_taxon_return, mocked_common_name_return, mocked_error, mocked_prefetch):
         mocked_query.return_value = None
         mocked_taxon_return.return_value = 'species', 'genus'
         self.fake_manifest.sample_id = 'abc123'
         self.fake_manifest.common_name = 'species'
         self.fake_manifest.taxon_id = '12345'
-        self.fake_manifest.query_id = 'species12345'
         ENTRY_LIST = [self.fake_manifest]
         returned_value = vl.verify_entries(ENTRY_LIST)
         expected_return = []
@@ -246,15 +669,15 @@ class TestValidationRunner(unittest.TestCase):
         mocked_common_name_return.assert_not_called()
         mocked_error.assert_not_called()
 
+    @patch('validation_components.validation.prefetch_lookups', return_value=({}, {}))
     @patch('validation_components.validation.resolve_taxon_id')
     @patch('validation_components.manifest_querying.NcbiQuery.__init__')
-    def test_verify_entries_matching_gets_one_search_for_repeated_query_ids(self, mocked_query, mocked_taxon_return):
+    def test_verify_entries_matching_gets_one_search_for_repeated_query_ids(self, mocked_query, mocked_taxon_return, mocked_prefetch):
         mocked_query.return_value = None
         mocked_taxon_return.return_value = 'species', 'genus'
         self.fake_manifest.sample_id = 'abc123'
         self.fake_manifest.common_name = 'species'
         self.fake_manifest.taxon_id = '12345'
-        self.fake_manifest.query_id = 'species12345'
         self.fake_manifest2 = self.fake_manifest
         self.fake_manifest2.sample_id = 'xyz456'
         ENTRY_LIST = [self.fake_manifest]
@@ -263,12 +686,13 @@ class TestValidationRunner(unittest.TestCase):
         self.assertEqual(returned_value, expected_return)
         mocked_taxon_return.assert_called_once()
 
+    @patch('validation_components.validation.prefetch_lookups', return_value=({}, {}))
     @patch('validation_components.validation.define_error')
     @patch('validation_components.validation.resolve_error')
     @patch('validation_components.validation.resolve_common_name')
     @patch('validation_components.validation.resolve_taxon_id')
     @patch('validation_components.manifest_querying.NcbiQuery.__init__')
-    def test_verify_entries_non_matching_get_searched_twice(self, mocked_query, mocked_taxon_return, mocked_common_name_return, mocked_resolve, mocked_definition):
+    def test_verify_entries_non_matching_get_searched_twice(self, mocked_query, mocked_taxon_return, mocked_common_name_return, mocked_resolve, mocked_definition, mocked_prefetch):
         mocked_query.return_value = None
         mocked_common_name_return.return_value = '67890'
         mocked_taxon_return.return_value = 'species2', 'genus'
@@ -276,7 +700,6 @@ class TestValidationRunner(unittest.TestCase):
         self.fake_manifest.sample_id = 'abc123'
         self.fake_manifest.common_name = 'species'
         self.fake_manifest.taxon_id = '12345'
-        self.fake_manifest.query_id = 'species12345'
         ENTRY_LIST = [self.fake_manifest]
         returned_value = vl.verify_entries(ENTRY_LIST)
         expected_return = ['abc123term1']
@@ -286,6 +709,86 @@ class TestValidationRunner(unittest.TestCase):
         mocked_resolve.assert_called_once()
         mocked_definition.assert_called_once()
 
+    @patch('validation_components.validation.prefetch_lookups',
+           return_value=({'12345': ('species', 'species'), '67890': ('__unresolved__', None)},
+                         {'wrong name': '__unresolved__'}))
+    def test_verify_entries_reports_unresolved_entries(self, mocked_prefetch):
+        entries = [m_query.ManifestEntry('abc123', 'wrong name', '12345'),
+                   m_query.ManifestEntry('def456', 'species', '67890'),
+                   m_query.ManifestEntry('ghi789', 'species', '12345')]
+        returned_value = vl.verify_entries(entries, self.mocked_query)
+        expected_return = ['abc123' + vl.UNRESOLVED_ERROR, 'def456' + vl.UNRESOLVED_ERROR]
+        self.assertEqual(returned_value, expected_return)
+
+    def test_iter_errors_only_checks_rows_changed_since_the_previous_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results_file = os.path.join(directory, 'results.json')
+            self.mocked_query.query_ncbi_for_common_names.return_value = {'12345': ('species', 'species'),
+                                                                          '67890': ('__unresolved__', None)}
+            first_run = ResultStore(results_file)
+            entries = [m_query.ManifestEntry('abc123', 'species', '12345'),
+                       m_query.ManifestEntry('def456', 'species', '67890')]
+            list(vl.iter_errors(entries, self.mocked_query, results=first_run))
+            first_run.save()
+
+            second_run = ResultStore(results_file)
+            self.mocked_query.query_ncbi_for_common_names.return_value = {'67890': ('species', 'species'),
+                                                                          '11111': ('species', 'species')}
+            entries = [m_query.ManifestEntry('abc123', 'species', '12345'),
+                       m_query.ManifestEntry('def456', 'species', '67890'),
+                       m_query.ManifestEntry('ghi789', 'species', '11111')]
+            self.assertEqual(list(vl.iter_errors(entries, self.mocked_query, results=second_run)), [])
+            self.mocked_query.query_ncbi_for_common_names.assert_called_with({'67890', '11111'})
+
+    @patch('validation_components.validation.prefetch_lookups',
+           return_value=({'7955': ('Danio rerio', 'species')}, {'Danio reri': '__null__'}))
+    def test_unknown_names_get_suggestions(self, mocked_prefetch):
+        self.mocked_query.suggest_names.return_value = [('Danio rerio', '7955')]
+        returned_value = vl.verify_entries([m_query.ManifestEntry('abc123', 'Danio reri', '7955')], self.mocked_query)
+        self.assertTrue(returned_value[0].endswith(" Did you mean 'Danio rerio' (taxon ID 7955)?"))
+        self.mocked_query.suggest_names.assert_called_once_with('Danio reri')
+
+    def test_ncbi_suggestions_come_from_cached_names(self):
+        cache = MagicMock()
+        cache.scientific_names.return_value = [('Danio rerio', '7955'), ('Homo sapiens', '9606')]
+        ncbi_queries = m_query.NcbiQuery(cache=cache)
+        self.assertEqual(ncbi_queries.suggest_names('Danio reri'), [('Danio rerio', '7955')])
+        self.assertEqual(m_query.NcbiQuery().suggest_names('Danio reri'), [])
+
+    def test_ncbi_suggestions_include_taxa_cached_since_the_last_suggestion(self):
+        ncbi_queries = m_query.NcbiQuery(cache=TaxonomyCache(':memory:'))
+        self.assertEqual(ncbi_queries.suggest_names('Danio reri'), [])
+        ncbi_queries.cache.put_common_names({'7955': ('Danio rerio', 'species')})
+        self.assertEqual(ncbi_queries.suggest_names('Danio reri'), [('Danio rerio', '7955')])
+
+    @patch('validation_components.validation.prefetch_lookups',
+           return_value=({'7955': ('Danio rerio', 'species'), '7954': ('Danio', 'family')}, {'Homo sapiens': '9606'}))
+    def test_errors_carry_records_of_what_was_wrong(self, mocked_prefetch):
+        entries = [m_query.ManifestEntry('abc123', 'Homo sapiens', '7955', row=5),
+                   m_query.ManifestEntry('def456', 'Danio', '7954', row=6),
+                   m_query.ManifestEntry('ghi789', '__null__', '__null__', row=7)]
+        mismatch, rank, missing = vl.verify_entries(entries, self.mocked_query)
+        self.assertEqual({field: mismatch.record[field] for field in ['sample_id', 'row', 'error', 'error_code',
+                                                                      'given_name', 'given_taxon_id',
+                                                                      'expected_name', 'expected_taxon_id', 'rank']},
+                         {'sample_id': 'abc123', 'row': 5, 'error': 'mismatch', 'error_code': 1,
+                          'given_name': 'Homo sapiens', 'given_taxon_id': '7955', 'expected_name': 'Danio rerio',
+                          'expected_taxon_id': '9606', 'rank': 'species'})
+        self.assertEqual(mismatch.record['message'], mismatch)
+        self.assertEqual((rank.record['error'], rank.record['rank']), ('rank', 'family'))
+        self.assertEqual((missing.record['error'], missing.record['given_name']), ('missing_taxonomy', None))
+
+    def test_prefetch_lookups_skips_known_values(self):
+        entries = [m_query.ManifestEntry('s1', 'wrong name', '12345'),
+                   m_query.ManifestEntry('s2', 'other name', '67890')]
+        self.mocked_query.query_ncbi_for_common_names.return_value = {'67890': ('other', 'genus')}
+        self.mocked_query.query_ncbi_for_taxon_ids.return_value = {'other name': '3'}
+        new_taxa, new_names = vl.prefetch_lookups(self.mocked_query, entries, {'12345': ('species', 'species')},
+                                                  {'wrong name': '__null__'})
+        self.mocked_query.query_ncbi_for_common_names.assert_called_once_with({'67890'})
+        self.mocked_query.query_ncbi_for_taxon_ids.assert_called_once_with({'other name'})
+        self.assertEqual((new_taxa, new_names), ({'67890': ('other', 'genus')}, {'other name': '3'}))
+
     def test_resolve_common_name_present_initial_returns_ncbi_search(self):
         self.fake_manifest.common_name = 'species'
         self.fake_manifest.taxon_id = '12345'
@@ -318,6 +821,34 @@ class TestValidationRunner(unittest.TestCase):
         EXPECTED_RESULT = 'Not null', None
         self.assertEqual(returned_value, EXPECTED_RESULT)
 
+    def test_prefetch_lookups_only_searches_mismatched_names(self):
+        entries = [m_query.ManifestEntry('s1', 'species', '12345'),
+                   m_query.ManifestEntry('s2', 'wrong name', '12345'),
+                   m_query.ManifestEntry('s3', 'no id', '__null__'),
+                   m_query.ManifestEntry('s4', '__null__', '67890')]
+        self.mocked_query.query_ncbi_for_common_names.return_value = {'12345': ('species', 'species'),
+                                                                      '67890': ('other', 'genus')}
+        self.mocked_query.query_ncbi_for_taxon_ids.return_value = {'wrong name': '__null__', 'no id': '3'}
+        taxon_lookup, name_lookup = vl.prefetch_lookups(self.mocked_query, entries)
+        self.mocked_query.query_ncbi_for_common_names.assert_called_once_with({'12345', '67890'})
+        self.mocked_query.query_ncbi_for_taxon_ids.assert_called_once_with({'wrong name', 'no id'})
+        self.assertEqual(name_lookup, {'wrong name': '__null__', 'no id': '3'})
+
+    def test_resolve_common_name_reads_lookup_table(self):
+        self.fake_manifest.common_name = 'species'
+        returned_value = vl.resolve_common_name(self.mocked_query, self.fake_manifest, {'species': '12345'})
+        self.assertEqual(returned_value, '12345')
+        self.mocked_query.query_ncbi_for_taxon_id.assert_not_called()
+
+    def test_resolve_taxon_id_reads_lookup_table(self):
+        self.fake_manifest.common_name = 'value'
+        self.fake_manifest.taxon_id = '12345'
+        taxon_lookup = {'12345': ('Looked up', 'species')}
+        returned_value = vl.resolve_taxon_id(self.mocked_query, self.fake_manifest, taxon_lookup)
+        EXPECTED_RESULT = 'Looked up', 'species'
+        self.assertEqual(returned_value, EXPECTED_RESULT)
+        self.mocked_query.query_ncbi_for_common_name.assert_not_called()
+
     @patch('validation_components.manifest_querying.ManifestEntry.taxon_id_definition')
     @patch('validation_components.manifest_querying.ManifestEntry.common_name_definition')
     @patch('validation_components.manifest_querying.ManifestEntry.report_error')
@@ -393,13 +924,211 @@ class TestSpreadsheetParsing(unittest.TestCase):
         fake_manifest_4 = m_query.ManifestEntry(sample_id, common_name, taxon_id)
 
         expected = [fake_manifest_1, fake_manifest_2, fake_manifest_3, fake_manifest_4]
-        actual = loader.load_xlsx()
+        actual = loader.load()
         for position, return_value in enumerate(actual):
             self.assertEqual(return_value.sample_id, expected[position].sample_id)
             self.assertEqual(return_value.common_name, expected[position].common_name)
             self.assertEqual(return_value.taxon_id, expected[position].taxon_id)
             self.assertEqual(return_value.query_id, expected[position].query_id)
 
+    def test_xlsx_load_streams_entries(self):
+        loader = m_query.SpreadsheetLoader(os.path.join(self.data_dir, 'test_spreadsheet_loading.xlsx'))
+        entries = loader.load()
+        self.assertIsInstance(entries, types.GeneratorType)
+        self.assertEqual([entry.sample_id for entry in entries],
+                         ['sample1', 'sample2 null name', 'sample3 null id', 'sample4 after space'])
+
+    def test_xlsx_extract_value_normalises_cells(self):
+        self.assertEqual(m_query.XlsxLoader.extract_value(' Danio\xa0rerio '), 'Danio rerio')
+        self.assertEqual(m_query.XlsxLoader.extract_value('   '), '__null__')
+        self.assertEqual(m_query.XlsxLoader.extract_value(None), '__null__')
+        self.assertEqual(m_query.XlsxLoader.extract_value(7955.0), '7955')
+
+    def test_missing_header_row_raises(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'no_header.xlsx')
+            workbook = openpyxl.Workbook()
+            workbook.active.append(['SUPPLIER SAMPLE NAME', 'TAXON ID', 'COMMON NAME'])
+            workbook.save(path)
+            loader = m_query.SpreadsheetLoader(path)
+            with self.assertRaises(ValueError):
+                list(loader.load())
+
+    def test_sniff_recognises_formats_by_content(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'legacy_manifest.xlsx')
+            with open(path, 'wb') as manifest:
+                manifest.write(m_query.XlsLoader.magic + bytes(100))
+            self.assertIs(m_query.SpreadsheetLoader.sniff(path), m_query.XlsLoader)
+        self.assertIs(m_query.SpreadsheetLoader.sniff(os.path.join(self.data_dir, 'test_spreadsheet_loading.xlsx')),
+                      m_query.XlsxLoader)
+
+    def test_sniff_falls_back_on_extension(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'empty.XLS')
+            open(path, 'wb').close()
+            self.assertIs(m_query.SpreadsheetLoader.sniff(path), m_query.XlsLoader)
+
+    def test_sniff_rejects_unknown_formats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'manifest.pdf')
+            with open(path, 'wb') as manifest:
+                manifest.write(b'%PDF-1.4')
+            with self.assertRaises(ValueError):
+                m_query.SpreadsheetLoader.sniff(path)
+
+    def write_text_manifest(self, directory, file_name, delimiter):
+        rows = [['Manifest exported from LIMS', '', '', ''],
+                ['SANGER PLATE ID', 'SUPPLIER SAMPLE NAME', 'TAXON ID', 'COMMON NAME'],
+                ['plate1', 'sample1', '7955', 'Danio\xa0rerio '],
+                ['plate1', '', '9606', 'Homo sapiens'],
+                ['plate1', 'sample2 null id', '', 'Homo sapiens'],
+                ['plate1', 'sample3 short row']]
+        path = os.path.join(directory, file_name)
+        with open(path, 'w', encoding='utf-8-sig') as manifest:
+            manifest.write('\n'.join(delimiter.join(row) for row in rows) + '\n')
+        return path
+
+    def test_text_manifests_load_like_spreadsheets(self):
+        expected = [('sample1', 'Danio rerio', '7955'), ('sample2 null id', 'Homo sapiens', '__null__'),
+                    ('sample3 short row', '__null__', '__null__')]
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name, delimiter in [('manifest.csv', ','), ('manifest.tsv', '\t'), ('manifest.txt', '\t')]:
+                loader = m_query.SpreadsheetLoader(self.write_text_manifest(directory, file_name, delimiter))
+                self.assertEqual(loader._format, 'csv')
+                actual = [(entry.sample_id, entry.common_name, entry.taxon_id) for entry in loader.load()]
+                self.assertEqual(actual, expected)
+
+    def test_entries_know_their_row_numbers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            loader = m_query.SpreadsheetLoader(self.write_text_manifest(directory, 'manifest.csv', ','))
+            self.assertEqual([entry.row for entry in loader.load()], [3, 5, 6])
+
+    def test_expand_manifests_reads_directories_and_globs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name in ['b.xlsx', 'a.csv', 'notes.pdf', 'README.txt', '~$a.xlsx']:
+                open(os.path.join(directory, file_name), 'w').close()
+            self.assertEqual(vl.expand_manifests(directory),
+                             [os.path.join(directory, 'a.csv'), os.path.join(directory, 'b.xlsx')])
+            self.assertEqual(vl.expand_manifests([os.path.join(directory, '*.xlsx'), 'other.xls']),
+                             [os.path.join(directory, 'b.xlsx'), os.path.join(directory, '~$a.xlsx'), 'other.xls'])
+            self.assertEqual(vl.expand_manifests(os.path.join(directory, '*.txt')),
+                             [os.path.join(directory, 'README.txt')])
+            with self.assertRaises(ValueError):
+                vl.expand_manifests(os.path.join(directory, '*.xls'))
+            with self.assertRaisesRegex(ValueError, r'No manifests match .*\*\.xls$'):
+                vl.expand_manifests([os.path.join(directory, '*.xls'), os.path.join(directory, 'a.csv')])
+
+    def test_load_manifest_reports_unreadable_files(self):
+        entries, load_error = vl.load_manifest(os.path.join(self.data_dir, 'missing.xlsx'))
+        self.assertEqual(list(entries), [])
+        self.assertIn('missing.xlsx', load_error)
+
+    @patch('builtins.print')
+    @patch('concurrent.futures.ProcessPoolExecutor', ThreadPoolExecutor)
+    @patch('validation_components.validation.build_connecter')
+    def test_batch_validation_resolves_all_manifests_together(self, mocked_connecter, mocked_print):
+        connecter = mocked_connecter.return_value.__enter__.return_value
+        connecter.query_ncbi_for_common_names.return_value = {'tax_id1': ('common_name1', 'species'),
+                                                              'tax_id2': ('__null__', None),
+                                                              'tax_id4': ('common_name4', 'species')}
+        connecter.query_ncbi_for_taxon_ids.return_value = {'common_name3': '__null__'}
+        with tempfile.TemporaryDirectory() as directory:
+            for copy in range(2):
+                shutil.copy(os.path.join(self.data_dir, 'test_spreadsheet_loading.xlsx'),
+                            os.path.join(directory, f'manifest{copy}.xlsx'))
+            vl.validation_runner(TestValidationRunner.Namespace(spreadsheet=[directory], workers=2))
+        connecter.query_ncbi_for_common_names.assert_called_once_with({'tax_id1', 'tax_id2', 'tax_id4'})
+        connecter.query_ncbi_for_taxon_ids.assert_called_once_with({'common_name3'})
+        printed = [call[0][0] for call in mocked_print.call_args_list]
+        self.assertEqual(len([line for line in printed if line.endswith('Errors found within manifest:')]), 2)
+        self.assertEqual(printed[-1], '0 of 2 manifests validated without errors.')
+
+    @staticmethod
+    def write_multi_sheet_workbook(path):
+        workbook = openpyxl.Workbook()
+        workbook.active.title = 'Instructions'
+        workbook.active.append(['Fill in one tab per plate'])
+        for plate, (taxon_id, common_name) in enumerate([('tax_id1', 'common_name1'), ('tax_id4', 'wrong name')], 1):
+            sheet = workbook.create_sheet(f'Plate {plate}')
+            sheet.append(['SANGER PLATE ID', 'SUPPLIER SAMPLE NAME', 'TAXON ID', 'COMMON NAME'])
+            sheet.append([f'plate{plate}', f'sample{plate}', taxon_id, common_name])
+        workbook.save(path)
+
+    def test_xlsx_rows_beyond_a_wrong_dimension_tag_are_read(self):
+        with tempfile.TemporaryDirectory() as directory:
+            written = os.path.join(directory, 'written.xlsx')
+            workbook = openpyxl.Workbook()
+            workbook.active.append(['Manifest exported from LIMS'])
+            workbook.active.append(['SANGER PLATE ID', 'SUPPLIER SAMPLE NAME', 'TAXON ID', 'COMMON NAME'])
+            for number in range(4):
+                workbook.active.append(['plate1', f'sample{number}', 7955, 'Danio rerio'])
+            workbook.save(written)
+            for dimension in ['A1:D3', 'A1']:
+                manifest = os.path.join(directory, 'manifest.xlsx')
+                with zipfile.ZipFile(written) as source, zipfile.ZipFile(manifest, 'w') as target:
+                    for item in source.infolist():
+                        content = source.read(item.filename)
+                        if item.filename == 'xl/worksheets/sheet1.xml':
+                            content = re.sub(rb'<dimension ref="[^"]*"', f'<dimension ref="{dimension}"'.encode(),
+                                             content)
+                            self.assertIn(f'<dimension ref="{dimension}"'.encode(), content)
+                        target.writestr(item, content)
+                loader = m_query.SpreadsheetLoader(manifest)
+                self.assertEqual(loader.sheets(), ['Sheet'])
+                entries = m_query.SpreadsheetLoader(manifest).load()
+                self.assertEqual([entry.sample_id for entry in entries], [f'sample{number}' for number in range(4)])
+
+    def test_expand_sheets_lists_sheets_with_a_header_row(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workbook = os.path.join(directory, 'plates.xlsx')
+            self.write_multi_sheet_workbook(workbook)
+            text_manifest = self.write_text_manifest(directory, 'manifest.csv', ',')
+            self.assertEqual(vl.expand_sheets([workbook, text_manifest]),
+                             ([workbook, workbook, text_manifest], ['Plate 1', 'Plate 2', None]))
+            entries = m_query.SpreadsheetLoader(workbook, sheet='Plate 2').load()
+            self.assertEqual([(entry.sample_id, entry.row) for entry in entries], [('sample2', 2)])
+
+    @patch('builtins.print')
+    @patch('concurrent.futures.ProcessPoolExecutor', ThreadPoolExecutor)
+    @patch('validation_components.validation.build_connecter')
+    def test_all_sheets_are_resolved_together_and_reported_per_sheet(self, mocked_connecter, mocked_print):
+        connecter = mocked_connecter.return_value.__enter__.return_value
+        connecter.query_ncbi_for_common_names.return_value = {'tax_id1': ('common_name1', 'species'),
+                                                              'tax_id4': ('common_name4', 'species')}
+        connecter.query_ncbi_for_taxon_ids.return_value = {'wrong name': '__null__'}
+        connecter.suggest_names.return_value = []
+        with tempfile.TemporaryDirectory() as directory:
+            workbook = os.path.join(directory, 'plates.xlsx')
+            self.write_multi_sheet_workbook(workbook)
+            vl.validation_runner(TestValidationRunner.Namespace(spreadsheet=[workbook], all_sheets=True, workers=2))
+        connecter.query_ncbi_for_common_names.assert_called_once_with({'tax_id1', 'tax_id4'})
+        printed = [call[0][0] for call in mocked_print.call_args_list]
+        self.assertIn(f'{workbook} [Plate 1]: Manifest successfully validated, no errors found!', printed)
+        self.assertIn(f'{workbook} [Plate 2]: Errors found within manifest:', printed)
+        self.assertEqual(printed[-1], '1 of 2 manifests validated without errors.')
+
+    @patch('validation_components.manifest_querying.LOADERS', [])
+    def test_registered_loaders_are_used(self):
+        @m_query.register_loader
+        class FakeLoader:
+            format = 'fake'
+            magic = None
+            extensions = ['.fake']
+
+            def __init__(self, file):
+                self.file = file
+
+            def load(self):
+                yield m_query.ManifestEntry('sample1', 'common_name1', 'tax_id1')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'manifest.fake')
+            open(path, 'wb').close()
+            loader = m_query.SpreadsheetLoader(path)
+            self.assertEqual(loader._format, 'fake')
+            self.assertEqual([entry.sample_id for entry in loader.load()], ['sample1'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import argparse
+import os
+import tempfile
+
+from unittest.mock import patch, MagicMock
+from validation_components.warm_cache import warm_cache, read_list
+
+
+class TestWarmCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.connecter = MagicMock()
+        self.connecter.__enter__.return_value = self.connecter
+        self.connecter.cache.get_common_names.return_value = {'7955': ('Danio rerio', 'species')}
+        self.connecter.cache.get_taxon_ids.return_value = {}
+        self.connecter.query_ncbi_for_common_names.side_effect = \
+            lambda taxon_ids: {taxon_id: ('Homo sapiens', 'species') for taxon_id in taxon_ids}
+        self.connecter.query_ncbi_for_taxon_ids.side_effect = lambda names: {name: '__null__' for name in names}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, file_name, content):
+        path = os.path.join(self.directory.name, file_name)
+        with open(path, 'w') as written_file:
+            written_file.write(content)
+        return path
+
+    def test_read_list_skips_blank_lines_and_comments(self):
+        list_file = self.write('taxa.txt', '# lab organisms\n7955\n\n 9606 \n')
+        self.assertEqual(read_list(list_file), ['7955', '9606'])
+
+    @patch('builtins.print')
+    def test_only_uncached_values_are_resolved_in_chunks(self, mocked_print):
+        arguments = argparse.Namespace(manifests=[], taxon_ids=[self.write('taxa.txt', '7955\n9606\n10090\n')],
+                                       names=[self.write('names.txt', 'Danio rerio\n')])
+        with patch('validation_components.warm_cache.build_connecter', return_value=self.connecter):
+            warm_cache(arguments, taxon_chunk_size=1)
+        self.assertEqual([call[0][0] for call in self.connecter.query_ncbi_for_common_names.call_args_list],
+                         [['10090'], ['9606']])
+        self.connecter.query_ncbi_for_taxon_ids.assert_called_once_with(['Danio rerio'])
+        mocked_print.assert_called_with('Cached 3 taxon IDs and 1 names.')
+
+    @patch('builtins.print')
+    def test_manifests_cache_what_their_validation_looks_up(self, mocked_print):
+        manifest = self.write('manifest.csv', 'SANGER PLATE ID,SUPPLIER SAMPLE NAME,TAXON ID,COMMON NAME\n'
+                                              'plate1,sample1,7955,Danio rerio\n'
+                                              'plate1,sample2,9606,human\n')
+        arguments = argparse.Namespace(manifests=[manifest], taxon_ids=[], names=[])
+        with patch('validation_components.warm_cache.build_connecter', return_value=self.connecter):
+            warm_cache(arguments)
+        self.connecter.query_ncbi_for_common_names.assert_called_once_with(['9606'])
+        self.connecter.query_ncbi_for_taxon_ids.assert_called_once_with(['human'])
+
+    @patch('builtins.print')
+    def test_unresolved_values_are_reported(self, mocked_print):
+        self.connecter.query_ncbi_for_common_names.side_effect = \
+            lambda taxon_ids: {taxon_id: ('__unresolved__', None) for taxon_id in taxon_ids}
+        arguments = argparse.Namespace(manifests=[], taxon_ids=[self.write('taxa.txt', '9606\n')], names=[])
+        with patch('validation_components.warm_cache.build_connecter', return_value=self.connecter):
+            warm_cache(arguments)
+        self.assertIn('run warm-cache again to retry them', mocked_print.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
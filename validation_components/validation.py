@@ -1,49 +1,486 @@
-from validation_components.manifest_querying import SpreadsheetLoader, ManifestEntry, NcbiQuery
+from validation_components.manifest_querying import SpreadsheetLoader, ManifestEntry, NcbiQuery, LOADERS, EntryError
+from validation_components.taxonomy_cache import TaxonomyCache
+from validation_components.taxdump import TaxdumpQuery
+from validation_components.rate_limiting import RetryPolicy
+from validation_components.metrics import Metrics
+from validation_components.result_store import ResultStore
+from validation_components.entry_store import EntryStore
 import argparse
+import os
+import sys
+import json
+import glob
+import time
+import queue
+import random
+import threading
+from collections import ChainMap
+
+UNRESOLVED_ERROR = ': Could not be checked as NCBI did not respond - please validate again.'
+# new taxon IDs and names resolved by the first chunk of a run that may stop early
+EARLY_CHUNK_SIZE = 20
+
 
 def validation_runner(arguments: argparse.Namespace):
-    '''Runs the checks for taxonomy and common_name errors in a given manifest'''
-    loader = SpreadsheetLoader(arguments.spreadsheet)
-    if loader._format == 'xls':
-        all_entries = loader.load()
+    '''Runs the checks for taxonomy and common_name errors in the given manifests'''
+    manifests = expand_manifests(arguments.spreadsheet)
+    sheets = [None] * len(manifests)
+    metrics = build_metrics(arguments)
+    results = build_result_store(arguments)
+    with metrics.stage('total'):
+        if getattr(arguments, 'all_sheets', False):
+            manifests, sheets = expand_sheets(manifests)
+        if len(manifests) > 1:
+            batch_validation_runner(manifests, arguments, metrics, results, sheets)
+        else:
+            all_entries = SpreadsheetLoader(manifests[0], metrics, sheets[0]).load()
+            with build_connecter(arguments, metrics) as connecter:
+                check_manifest(read_ahead(all_entries), connecter, arguments,
+                               manifest_label(manifests[0], sheets[0]) if ndjson_output(arguments) else None,
+                               metrics=metrics, results=results)
+    if results is not None:
+        results.save()
+    report_metrics(metrics, arguments)
+
+
+def batch_validation_runner(manifests, arguments: argparse.Namespace, metrics=None, results=None, sheets=None):
+    '''Parses manifests, or the named sheets of them, in parallel processes and reports on each one in turn'''
+    from concurrent.futures import ProcessPoolExecutor
+    metrics = metrics or Metrics(enabled=False)
+    sheets = sheets or [None] * len(manifests)
+    with metrics.stage('load'), ProcessPoolExecutor(getattr(arguments, 'workers', None)) as pool:
+        loaded_manifests = list(pool.map(load_manifest, manifests, sheets))
+
+    failed_manifests = 0
+    with build_connecter(arguments, metrics) as connecter:
+        # the taxa of every manifest are resolved together unless checking may stop early, leaving some never reached
+        if error_budget(arguments) is None and not getattr(arguments, 'sample', None):
+            with metrics.stage('resolve'):
+                if results is None:
+                    unchecked_entries = [manifest_entry for entries, load_error in loaded_manifests
+                                         for manifest_entry in entries.distinct_entries()]
+                else:
+                    unchecked_entries = [manifest_entry for entries, load_error in loaded_manifests
+                                         for manifest_entry in entries if results.lookup(manifest_entry) is None]
+                lookups = prefetch_lookups(connecter, unchecked_entries)
+        else:
+            lookups = ({}, {})
+        for manifest, sheet, (entries, load_error) in zip(manifests, sheets, loaded_manifests):
+            manifest = manifest_label(manifest, sheet)
+            if load_error is not None:
+                if ndjson_output(arguments):
+                    print(json.dumps({'type': 'unreadable', 'manifest': manifest, 'message': load_error}), flush=True)
+                else:
+                    print(f'{manifest}: Could not be read - {load_error}')
+                error_count = 1
+            else:
+                error_count = check_manifest(entries, connecter, arguments, manifest, lookups=lookups, metrics=metrics,
+                                             results=results)
+            failed_manifests += error_count > 0
+    if not ndjson_output(arguments):
+        print(f'{len(manifests) - failed_manifests} of {len(manifests)} manifests validated without errors.')
+
+
+def expand_manifests(paths):
+    '''Expands directories and glob patterns among paths into the manifest files they hold'''
+    if isinstance(paths, str):
+        paths = [paths]
+    # directories are scanned for the extensions manifests are saved with, so notes such as a README.txt are left out
+    extensions = tuple(extension for loader_class in LOADERS
+                       for extension in getattr(loader_class, 'directory_extensions', loader_class.extensions))
+    manifests = []
+    for path in paths:
+        if os.path.isdir(path):
+            manifests.extend(sorted(os.path.join(path, file_name) for file_name in os.listdir(path)
+                                    if file_name.lower().endswith(extensions) and not file_name.startswith('~$')))
+        elif glob.has_magic(path):
+            matches = sorted(glob.glob(path))
+            if not matches:
+                raise ValueError(f'No manifests match {path}')
+            manifests.extend(matches)
+        else:
+            manifests.append(path)
+    if not manifests:
+        raise ValueError(f"No manifests found in {', '.join(paths)}")
+    return manifests
+
+
+def expand_sheets(manifests):
+    '''
+    Lists every worksheet with a 'SANGER PLATE ID' header row in each manifest, returning the manifest of each sheet
+    and its name. Manifests without named sheets, or without any such sheet, appear once with no sheet name
+    '''
+    sheet_manifests = []
+    sheets = []
+    for manifest in manifests:
+        try:
+            manifest_sheets = SpreadsheetLoader(manifest).sheets() or [None]
+        except Exception:
+            # the error reading it is reported when the manifest is loaded
+            manifest_sheets = [None]
+        sheet_manifests.extend([manifest] * len(manifest_sheets))
+        sheets.extend(manifest_sheets)
+    return sheet_manifests, sheets
+
+
+def manifest_label(manifest, sheet=None):
+    '''Names a manifest in reports, followed by its worksheet when one was chosen'''
+    return manifest if sheet is None else f'{manifest} [{sheet}]'
+
+
+def load_manifest(manifest, sheet=None):
+    '''
+    Reads every entry of a manifest in a worker process into an EntryStore, which is compact to send back, returning it
+    and any error reading the manifest
+    '''
+    try:
+        return EntryStore(SpreadsheetLoader(manifest, sheet=sheet).load()), None
+    except Exception as error:
+        return EntryStore(), str(error)
+
+
+def check_manifest(entries, connecter, arguments: argparse.Namespace, manifest=None, lookups=None, metrics=None,
+                   results=None):
+    '''Checks a manifest within the --sample and --max-errors limits and returns how many errors it reported'''
+    metrics = metrics or Metrics(enabled=False)
+    report = report_records if ndjson_output(arguments) else report_errors
+    max_errors = error_budget(arguments)
+    lookups = lookups or ({}, {})
+    sample_size = getattr(arguments, 'sample', None)
+    if sample_size:
+        entries = list(entries)
+        with metrics.stage('sample'):
+            sample_errors = list(iter_errors(sample_entries(entries, sample_size), connecter, lookups=lookups))
+        if sample_errors:
+            return report(iter(sample_errors), manifest, max_errors, sample_size)
+    # small first chunks let a run that stops early do so after a few lookups rather than a full chunk of them
+    errors = iter_errors(entries, connecter, lookups=lookups, metrics=metrics, results=results,
+                         first_chunk_size=None if max_errors is None else EARLY_CHUNK_SIZE)
+    return report(errors, manifest, max_errors)
+
+
+def error_budget(arguments: argparse.Namespace):
+    '''The number of errors after which validation stops, or None to check every row'''
+    if getattr(arguments, 'fail_fast', False):
+        return 1
+    return getattr(arguments, 'max_errors', None)
+
+
+def sample_entries(entries, sample_size, seed=None):
+    '''Picks an entry for each of up to sample_size distinct taxon ID and common name pairs at random'''
+    first_entries = {}
+    for manifest_entry in entries:
+        first_entries.setdefault((manifest_entry.taxon_id, manifest_entry.common_name), manifest_entry)
+    pairs = list(first_entries)
+    sampled_pairs = random.Random(seed).sample(pairs, min(sample_size, len(pairs)))
+    return [first_entries[pair] for pair in sampled_pairs]
+
+
+def incomplete_reason(error_count, max_errors=None, sample_size=None):
+    '''Why only part of a manifest was checked, or None if it was checked in full'''
+    if sample_size and error_count:
+        return 'sample'
+    if max_errors is not None and error_count >= max_errors:
+        return 'max_errors'
+    return None
+
+
+def report_errors(errors, manifest=None, max_errors=None, sample_size=None):
+    '''
+    Prints each error as soon as it is found, returning how many there were. No more errors are read once max_errors
+    were printed, and errors found in a sample of sample_size taxa are reported as such
+    '''
+    prefix = '' if manifest is None else f'{manifest}: '
+    error_count = 0
+    for error in errors:
+        if error_count == 0:
+            print(prefix + 'Errors found within manifest:', flush=True)
+        print('\t' + error, flush=True)
+        error_count += 1
+        if error_count == max_errors:
+            break
+    reason = incomplete_reason(error_count, max_errors, sample_size)
+    if reason == 'sample':
+        print(f'These errors were found in a sample of {sample_size} taxa - the rest of the manifest was not checked.')
+    elif reason == 'max_errors':
+        print(f'Reached the limit of {max_errors} errors - the rest of the manifest was not checked.')
+    if error_count > 0:
+        print('Please correct mistakes and validate again.')
     else:
-        all_entries = loader.load_xlsx()
+        print(prefix + 'Manifest successfully validated, no errors found!')
+    return error_count
+
+
+def ndjson_output(arguments: argparse.Namespace):
+    return getattr(arguments, 'output_format', 'text') == 'ndjson'
+
+
+def report_records(errors, manifest=None, max_errors=None, sample_size=None):
+    '''Writes each error as an NDJSON record followed by a summary record of the manifest, returning the error count'''
+    error_count = 0
+    for error in errors:
+        print(json.dumps(dict(error.record, type='error', manifest=manifest)), flush=True)
+        error_count += 1
+        if error_count == max_errors:
+            break
+    reason = incomplete_reason(error_count, max_errors, sample_size)
+    print(json.dumps({'type': 'summary', 'manifest': manifest, 'valid': error_count == 0, 'errors': error_count,
+                      'complete': reason is None, 'stopped_by': reason}), flush=True)
+    return error_count
 
-    error_list = verify_entries(all_entries)
 
-    if len(error_list) > 0:
-        print('Errors found within manifest:\n\t' + '\n\t'.join(error_list) + '\nPlease correct mistakes and validate again.')
+def read_ahead(entries, buffer_size=1000):
+    '''
+    Parses entries in a background thread up to buffer_size rows ahead of the consumer, so the spreadsheet carries on
+    being read while the rows already parsed wait for NCBI
+    '''
+    buffer = queue.Queue(buffer_size)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for entry in entries:
+                if stop.is_set():
+                    return
+                buffer.put(('entry', entry))
+            buffer.put(('done', None))
+        except Exception as error:
+            buffer.put(('error', error))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise value
+            yield value
+    finally:
+        stop.set()
+        while producer.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def build_metrics(arguments: argparse.Namespace):
+    '''Records metrics for a run only when they were asked for with --stats or --stats-file'''
+    return Metrics(enabled=bool(getattr(arguments, 'stats', False) or getattr(arguments, 'stats_file', None)))
+
+
+def build_result_store(arguments: argparse.Namespace):
+    '''
+    Opens the results of the previous run given with --results-file, trusting its verdicts only if they were reached
+    with the same resolver as this run
+    '''
+    if not getattr(arguments, 'results_file', None):
+        return None
+    if getattr(arguments, 'taxdump', None):
+        resolver = 'taxdump:' + os.path.abspath(arguments.taxdump)
     else:
-        print('Manifest successfully validated, no errors found!')
-
-
-def verify_entries(all_entries):
-    error_list = []
-    registered_values = {'__null____null__': ": No taxon ID or common name specified. If unkown please use 32644 - 'unidentified'."}
-    connecter = NcbiQuery()
-    for manifest_entry in all_entries:
-        if manifest_entry.query_id in registered_values.keys():
-            error_term = registered_values[manifest_entry.query_id]
-            if error_term is not None:
-                error_list.append((manifest_entry.sample_id + error_term))
-        else:
-            ncbi_common_name, ncbi_rank = resolve_taxon_id(connecter, manifest_entry)
+        resolver = 'ncbi:' + (getattr(arguments, 'eutils_url', None) or NcbiQuery.base_url)
+    return ResultStore(arguments.results_file, resolver, ttl_days=getattr(arguments, 'cache_ttl', 30))
+
+
+def report_metrics(metrics, arguments: argparse.Namespace):
+    if getattr(arguments, 'stats', False):
+        print(metrics.summary(), file=sys.stderr)
+    if getattr(arguments, 'stats_file', None):
+        metrics.write(arguments.stats_file, getattr(arguments, 'stats_format', 'json'))
+
+
+def build_connecter(arguments: argparse.Namespace, metrics=None):
+    '''
+    Creates the taxonomy resolver for a run: a TaxdumpQuery when an offline taxdump index was given, otherwise an
+    NcbiQuery backed by the persistent taxonomy cache unless it has been disabled. NCBI credentials not given as
+    arguments are read from $NCBI_API_KEY, $NCBI_TOOL and $NCBI_EMAIL
+    '''
+    suggestion_limit = getattr(arguments, 'suggestions', 3)
+    if getattr(arguments, 'taxdump', None):
+        return TaxdumpQuery(arguments.taxdump, suggestion_limit=suggestion_limit)
+    if getattr(arguments, 'no_cache', False):
+        cache = None
+    else:
+        cache = TaxonomyCache(getattr(arguments, 'cache_path', None),
+                              ttl_days=getattr(arguments, 'cache_ttl', 30),
+                              max_entries=getattr(arguments, 'cache_size', 100000),
+                              refresh=getattr(arguments, 'refresh_cache', False))
+    retry_policy = RetryPolicy(max_attempts=getattr(arguments, 'max_attempts', 5),
+                               budget=getattr(arguments, 'retry_budget', 100),
+                               refill_interval=getattr(arguments, 'retry_refill_interval', None))
+    return NcbiQuery(cache=cache, retry_policy=retry_policy, base_url=getattr(arguments, 'eutils_url', None),
+                     metrics=metrics,
+                     api_key=getattr(arguments, 'api_key', None) or os.environ.get('NCBI_API_KEY'),
+                     tool=getattr(arguments, 'tool', None) or os.environ.get('NCBI_TOOL', 'manifest-validator'),
+                     email=getattr(arguments, 'email', None) or os.environ.get('NCBI_EMAIL'),
+                     suggestion_limit=suggestion_limit)
+
+
+def verify_entries(all_entries, connecter=None):
+    return list(iter_errors(all_entries, connecter))
+
 
-            if ncbi_rank not in ['genus', 'species', 'subspecies', 'strain', '', None]:
-                error_list.append((manifest_entry.sample_id + f": Given taxon ID corresponds to the rank '{ncbi_rank}'"
-                                                              f" - please use a taxon no higher than  genus/species, "
-                                                              f" or the ID 32644 with "
-                                                              f"'unidentified' if a more accurate rank is not known."))
+def iter_errors(entries, connecter=None, chunk_size=200, lookups=None, metrics=None, results=None,
+                first_chunk_size=None):
+    '''Checks manifest entries in chunks as they stream in, yielding every error as soon as it is found'''
+    metrics = metrics or Metrics(enabled=False)
+    taxon_lookup, name_lookup = lookups or ({}, {})
+    suggestion_lookup = {}
+    verdicts = {}
+    if connecter is None:
+        connecter = NcbiQuery()
+    for chunk in chunk_entries(entries, chunk_size, first_chunk_size):
+        previous_errors = [None if results is None else results.lookup(manifest_entry) for manifest_entry in chunk]
+        unchecked_entries = [manifest_entry for manifest_entry, errors in zip(chunk, previous_errors) if errors is None]
+        known_values = len({manifest_entry.taxon_id for manifest_entry in unchecked_entries
+                            if manifest_entry.taxon_id in taxon_lookup}) + \
+            len({manifest_entry.common_name for manifest_entry in unchecked_entries
+                 if manifest_entry.common_name in name_lookup})
+        new_pairs = {(manifest_entry.common_name, manifest_entry.taxon_id): manifest_entry
+                     for manifest_entry in unchecked_entries
+                     if (manifest_entry.common_name, manifest_entry.taxon_id) not in verdicts}
+        with metrics.stage('resolve'):
+            new_taxon_lookup, new_name_lookup = prefetch_lookups(connecter, new_pairs.values(), taxon_lookup,
+                                                                 name_lookup)
+        taxon_lookup.update(new_taxon_lookup)
+        name_lookup.update(new_name_lookup)
+        checking = 0.0
+        checked_rows = reused_rows = verdict_misses = 0
+        # the chunk's figures are recorded even when the caller stops reading errors part way through it
+        try:
+            for manifest_entry, errors in zip(chunk, previous_errors):
+                checked_rows += 1
+                if errors is None:
+                    started = time.perf_counter()
+                    pair = (manifest_entry.common_name, manifest_entry.taxon_id)
+                    verdict = verdicts.get(pair)
+                    if verdict is None:
+                        verdict_misses += 1
+                        verdict = verdicts[pair] = check_pair(connecter, manifest_entry, taxon_lookup, name_lookup,
+                                                              suggestion_lookup)
+                    errors = [entry_error(manifest_entry, error_term, details) for error_term, details in verdict]
+                    checking += time.perf_counter() - started
+                else:
+                    reused_rows += 1
+                if results is not None:
+                    results.record(manifest_entry, errors,
+                                   reusable=not any(error.endswith(UNRESOLVED_ERROR) for error in errors))
+                yield from errors
+        finally:
+            metrics.add_time('stage_seconds', checking, stage='check')
+            metrics.count('manifest_rows', checked_rows)
+            metrics.count('reused_rows', reused_rows)
+            metrics.count('lookup_hits', known_values)
+            metrics.count('lookup_misses', len(new_taxon_lookup) + len(new_name_lookup))
+            metrics.count('verdict_hits', checked_rows - reused_rows - verdict_misses)
+            metrics.count('verdict_misses', verdict_misses)
 
-            if manifest_entry.common_name == ncbi_common_name:
-                error_term = None
+
+def chunk_entries(entries, chunk_size, first_chunk_size=None):
+    '''
+    Groups streamed entries into chunks that each hold at most chunk_size taxon IDs and names not seen in earlier
+    chunks, so every chunk resolves a bounded number of new values. Chunks start at first_chunk_size new values, if
+    given, and double up to chunk_size
+    '''
+    limit = min(first_chunk_size or chunk_size, chunk_size)
+    seen_taxon_ids = set()
+    seen_names = set()
+    chunk = []
+    new_values = 0
+    for manifest_entry in entries:
+        chunk.append(manifest_entry)
+        if manifest_entry.taxon_id not in seen_taxon_ids:
+            seen_taxon_ids.add(manifest_entry.taxon_id)
+            new_values += 1
+        if manifest_entry.common_name not in seen_names:
+            seen_names.add(manifest_entry.common_name)
+            new_values += 1
+        if new_values >= limit:
+            yield chunk
+            chunk = []
+            new_values = 0
+            limit = min(limit * 2, chunk_size)
+    if chunk:
+        yield chunk
+
+
+def check_pair(connecter, manifest_entry, taxon_lookup, name_lookup, suggestion_lookup=None):
+    '''
+    Checks the common name and taxon ID of an entry, returning an (error term, details) pair for each problem found.
+    The verdict depends only on those two values, so it holds for every row that repeats them
+    '''
+    errors = []
+    if manifest_entry.taxon_id == '__null__' and manifest_entry.common_name == '__null__':
+        return [(": No taxon ID or common name specified. If unkown please use 32644 - 'unidentified'.",
+                 {'error': 'missing_taxonomy'})]
+
+    details = None
+    ncbi_common_name, ncbi_rank = resolve_taxon_id(connecter, manifest_entry, taxon_lookup)
+    if ncbi_common_name == '__unresolved__':
+        error_term = UNRESOLVED_ERROR
+        details = {'error': 'unresolved'}
+    else:
+        if ncbi_rank not in ['genus', 'species', 'subspecies', 'strain', '', None]:
+            errors.append((f": Given taxon ID corresponds to the rank '{ncbi_rank}'"
+                           f" - please use a taxon no higher than  genus/species, "
+                           f" or the ID 32644 with "
+                           f"'unidentified' if a more accurate rank is not known.",
+                           {'error': 'rank', 'expected_name': ncbi_common_name, 'rank': ncbi_rank}))
+
+        if manifest_entry.common_name == ncbi_common_name:
+            error_term = None
+        else:
+            ncbi_taxon_id = resolve_common_name(connecter, manifest_entry, name_lookup)
+            if ncbi_taxon_id == '__unresolved__':
+                error_term = UNRESOLVED_ERROR
+                details = {'error': 'unresolved'}
             else:
-                ncbi_taxon_id = resolve_common_name(connecter, manifest_entry)
                 error_code = resolve_error(ncbi_common_name, ncbi_taxon_id, manifest_entry)
                 error_term = define_error(error_code, manifest_entry, ncbi_taxon_id, ncbi_common_name)
-                error_list.append((manifest_entry.sample_id+error_term))
-            registered_values[manifest_entry.query_id] = error_term
-    return error_list
+                suggestions = []
+                if ncbi_taxon_id == '__null__' and manifest_entry.common_name != '__null__':
+                    suggestions = resolve_suggestions(connecter, manifest_entry, suggestion_lookup)
+                    error_term += manifest_entry.suggestion_definition(suggestions)
+                details = {'error': 'mismatch', 'error_code': error_code, 'expected_name': ncbi_common_name,
+                           'expected_taxon_id': ncbi_taxon_id, 'rank': ncbi_rank,
+                           'suggestions': [{'name': name, 'taxon_id': taxon_id} for name, taxon_id in suggestions]}
+    if error_term is not None:
+        errors.append((error_term, details))
+    return errors
+
+
+def entry_error(manifest_entry, error_term, details):
+    '''Builds the error reported for an entry, recording the entry's values next to the details of what was wrong'''
+    record = {'sample_id': manifest_entry.sample_id, 'row': manifest_entry.row,
+              'given_name': manifest_entry.common_name, 'given_taxon_id': manifest_entry.taxon_id}
+    record.update(details or {})
+    for field in ['given_name', 'given_taxon_id', 'expected_name', 'expected_taxon_id']:
+        if record.get(field) == '__null__':
+            record[field] = None
+    return EntryError(manifest_entry.sample_id + error_term, record)
+
+
+def prefetch_lookups(connecter, all_entries, taxon_lookup=None, name_lookup=None):
+    '''
+    Resolves every distinct taxon ID, then every distinct common name that does not match the name of its taxon ID,
+    so all the lookups of each kind are in flight together instead of being made one row at a time. Values already in
+    taxon_lookup or name_lookup are not looked up again, and only the new results are returned
+    '''
+    known_taxa = taxon_lookup or {}
+    known_names = name_lookup or {}
+    taxon_ids = {manifest_entry.taxon_id for manifest_entry in all_entries
+                 if manifest_entry.taxon_id != '__null__' and manifest_entry.taxon_id not in known_taxa}
+    new_taxon_lookup = connecter.query_ncbi_for_common_names(taxon_ids) if taxon_ids else {}
+    all_taxa = ChainMap(new_taxon_lookup, known_taxa)
+    names = {manifest_entry.common_name for manifest_entry in all_entries
+             if manifest_entry.common_name != '__null__' and manifest_entry.common_name not in known_names
+             and resolve_taxon_id(connecter, manifest_entry, all_taxa)[0] not in
+             [manifest_entry.common_name, '__unresolved__']}
+    new_name_lookup = connecter.query_ncbi_for_taxon_ids(names) if names else {}
+    return new_taxon_lookup, new_name_lookup
 
 
 def define_error(error_code, manifest_entry, ncbi_taxon_id, ncbi_common_name):
@@ -64,18 +501,37 @@ def resolve_error(ncbi_common_name, ncbi_taxon_id, manifest_entry):
     return error_code
 
 
-def resolve_taxon_id(connecter, manifest_entry):
+def resolve_taxon_id(connecter, manifest_entry, taxon_lookup=None):
     if manifest_entry.taxon_id != '__null__':
-        ncbi_common_name, ncbi_rank = connecter.query_ncbi_for_common_name(manifest_entry)
+        if taxon_lookup is not None and manifest_entry.taxon_id in taxon_lookup:
+            ncbi_common_name, ncbi_rank = taxon_lookup[manifest_entry.taxon_id]
+        else:
+            ncbi_common_name, ncbi_rank = connecter.query_ncbi_for_common_name(manifest_entry)
+            if taxon_lookup is not None:
+                taxon_lookup[manifest_entry.taxon_id] = ncbi_common_name, ncbi_rank
     else:
         ncbi_common_name = "__null__"
         ncbi_rank = None
     return ncbi_common_name, ncbi_rank
 
 
-def resolve_common_name(connecter, manifest_entry):
+def resolve_common_name(connecter, manifest_entry, name_lookup=None):
     if manifest_entry.common_name != '__null__':
-        ncbi_taxon_id = connecter.query_ncbi_for_taxon_id(manifest_entry)
+        if name_lookup is not None and manifest_entry.common_name in name_lookup:
+            ncbi_taxon_id = name_lookup[manifest_entry.common_name]
+        else:
+            ncbi_taxon_id = connecter.query_ncbi_for_taxon_id(manifest_entry)
+            if name_lookup is not None:
+                name_lookup[manifest_entry.common_name] = ncbi_taxon_id
     else:
         ncbi_taxon_id = '__null__'
     return ncbi_taxon_id
+
+
+def resolve_suggestions(connecter, manifest_entry, suggestion_lookup=None):
+    if suggestion_lookup is not None and manifest_entry.common_name in suggestion_lookup:
+        return suggestion_lookup[manifest_entry.common_name]
+    suggestions = list(connecter.suggest_names(manifest_entry.common_name))
+    if suggestion_lookup is not None:
+        suggestion_lookup[manifest_entry.common_name] = suggestions
+    return suggestions
@@ -0,0 +1,66 @@
+import argparse
+from validation_components.manifest_querying import SpreadsheetLoader
+from validation_components.entry_store import EntryStore
+from validation_components.validation import build_connecter, expand_manifests
+
+
+def read_list(path):
+    '''Reads one value per line from a list file, skipping blank lines and # comments'''
+    with open(path, encoding='utf-8-sig') as list_file:
+        return [line.strip().replace('\xa0', ' ') for line in list_file
+                if line.strip() and not line.lstrip().startswith('#')]
+
+
+def warm(values, get_cached, resolve, is_unresolved, description, chunk_size):
+    '''
+    Resolves every value not yet in the cache a chunk at a time, so each chunk is stored before the next is requested
+    and an interrupted warm-up loses at most one chunk. Returns the lookup of every value and how many were unresolved
+    '''
+    values = sorted(values)
+    lookup = get_cached(values)
+    pending = [value for value in values if value not in lookup]
+    print(f'{description}: {len(lookup)} of {len(values)} already cached, resolving {len(pending)}', flush=True)
+    unresolved = 0
+    for start in range(0, len(pending), chunk_size):
+        chunk_lookup = resolve(pending[start:start + chunk_size])
+        unresolved += sum(1 for value in chunk_lookup.values() if is_unresolved(value))
+        lookup.update(chunk_lookup)
+        print(f'{description}: {min(start + chunk_size, len(pending))} of {len(pending)} resolved', flush=True)
+    return lookup, unresolved
+
+
+def warm_cache(arguments: argparse.Namespace, taxon_chunk_size=1000, name_chunk_size=100):
+    '''
+    Fills the persistent taxonomy cache with the taxon IDs and names listed in files and those a validation of the
+    given manifests would look up, through the same batched and rate limited requests as a validation
+    '''
+    taxon_ids = {taxon_id for list_file in arguments.taxon_ids for taxon_id in read_list(list_file)}
+    names = {name for list_file in arguments.names for name in read_list(list_file)}
+    entry_store = EntryStore()
+    if arguments.manifests:
+        for manifest in expand_manifests(arguments.manifests):
+            entry_store.extend(SpreadsheetLoader(manifest).load())
+    entries = entry_store.distinct_entries()
+    taxon_ids.update(manifest_entry.taxon_id for manifest_entry in entries if manifest_entry.taxon_id != '__null__')
+
+    with build_connecter(arguments) as connecter:
+        try:
+            taxon_lookup, unresolved_taxa = warm(
+                taxon_ids, connecter.cache.get_common_names, connecter.query_ncbi_for_common_names,
+                lambda result: result[0] == '__unresolved__', 'Taxon IDs', taxon_chunk_size)
+            # as in a validation, only names that do not match the name of their taxon ID are looked up
+            names.update(manifest_entry.common_name for manifest_entry in entries
+                         if manifest_entry.common_name != '__null__'
+                         and taxon_lookup.get(manifest_entry.taxon_id, ('__null__', None))[0]
+                         not in [manifest_entry.common_name, '__unresolved__'])
+            name_lookup, unresolved_names = warm(
+                names, connecter.cache.get_taxon_ids, connecter.query_ncbi_for_taxon_ids,
+                lambda result: result == '__unresolved__', 'Names', name_chunk_size)
+        except KeyboardInterrupt:
+            print('Interrupted - run warm-cache again to carry on where it stopped.')
+            return
+    if unresolved_taxa or unresolved_names:
+        print(f'{unresolved_taxa} taxon IDs and {unresolved_names} names could not be resolved as NCBI did not '
+              f'respond - run warm-cache again to retry them.')
+    else:
+        print(f'Cached {len(taxon_lookup)} taxon IDs and {len(name_lookup)} names.')